@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import aiohttp
+
+from bot import settings
+from bot.cache import SingleFlight
+from bot.logger import new_logger
+from bot.web import WebClient
+
+log = new_logger('Assets')
+
+
+class AssetError(Exception):
+    pass
+
+
+class AssetManager:
+    """
+    Downloads and keeps the files used by the modules (fonts, pictures, etc.) on the cache directory. Files are
+    streamed to disk in chunks, and revalidated with conditional requests (using their ETag and Last-Modified
+    headers) once they're older than settings.asset_revalidate seconds. The total size of the files is limited,
+    removing the least recently used files when it's exceeded. Files handed out to the modules are kept while
+    the bot runs, as their paths are used after retrieving them.
+    """
+    _ins = None
+    chunk_size = 65536
+
+    def __new__(cls):
+        if cls._ins is None:
+            cls._ins = super().__new__(cls)
+        return cls._ins
+
+    def __init__(self):
+        # The instance is shared, so it's initialized only once
+        if hasattr(self, 'index'):
+            return
+
+        self.path = settings.base_dir / 'cache' / 'assets'
+        self.index_path = self.path / 'index.json'
+        self.max_size = settings.asset_cache_disk * 1024 * 1024
+        self.index = None
+        self.pinned = set()
+        self.flights = SingleFlight()
+
+    async def get(self, filename, url, sha256=None, size=None):
+        """
+        Retrieves the local path of a file, downloading it if it's not stored yet, revalidating it if it's too old.
+        If the file could not be revalidated, the stored file is used.
+        :param filename: The local file name.
+        :param url: The file URL.
+        :param sha256: The expected SHA-256 hex digest of the file. If set, files with another checksum
+        are rejected.
+        :param size: The expected size of the file, in bytes. If set, files with another size are rejected.
+        :return: The file path, or None if it could not be retrieved.
+        """
+        if self.index is None:
+            # Concurrent first calls share the same read
+            index = await self.flights.run(self.index_path, asyncio.to_thread, self._load_index)
+            if self.index is None:
+                self.index = index
+
+        try:
+            return await self.flights.run(filename, self.load, filename, url, sha256, size)
+        except Exception as e:
+            log.error('Could not retrieve the %s file', filename)
+            log.exception(e)
+            return None
+
+    async def load(self, filename, url, sha256, size):
+        filepath = self.path / filename
+        meta = self.index.get(filename)
+        if meta is not None and not self._valid(filepath, meta, url, sha256, size):
+            log.debug('Stored %s file does not match, downloading it again', filename)
+            meta = None
+
+        if meta is None or time.time() - meta['checked'] > settings.asset_revalidate:
+            try:
+                meta = await self.download(filename, url, meta, sha256, size)
+            except (AssetError, aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                if meta is None:
+                    raise
+                log.warning('Could not revalidate the %s file, using the stored one: %s', filename, e)
+
+        meta['used'] = time.time()
+        self.index[filename] = meta
+        self.pinned.add(filename)
+        await self.save_index()
+        return str(filepath)
+
+    async def download(self, filename, url, meta, sha256, size):
+        """
+        Downloads a file, or revalidates it if it's stored. The file is streamed to a temporary file, verified
+        and then moved to its final path.
+        :return: The file metadata.
+        """
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        log.debug('Downloading %s from %s', filename, url)
+        async with WebClient().session().get(url, headers=headers) as r:
+            if r.status == 304 and meta is not None:
+                log.debug('File %s not modified', filename)
+                return dict(meta, checked=time.time())
+            if r.status != 200:
+                raise AssetError('Server returned status {}'.format(r.status))
+
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path / (filename + '.tmp')
+            checksum = hashlib.sha256()
+            total = 0
+
+            f = await asyncio.to_thread(open, tmp_path, 'wb')
+            try:
+                async for chunk in r.content.iter_chunked(self.chunk_size):
+                    checksum.update(chunk)
+                    total += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+            try:
+                # Compressed responses are decompressed, so their length is not the file size
+                encoded = 'Content-Encoding' in r.headers
+                if r.content_length is not None and not encoded and total != r.content_length:
+                    raise AssetError('Incomplete file ({} of {} bytes)'.format(total, r.content_length))
+                if size is not None and total != size:
+                    raise AssetError('Wrong file size ({} bytes, expected {})'.format(total, size))
+                if sha256 is not None and checksum.hexdigest() != sha256.lower():
+                    raise AssetError('Wrong file checksum')
+
+                await asyncio.to_thread(os.replace, tmp_path, self.path / filename)
+            except Exception:
+                await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+                raise
+
+            log.info('File %s downloaded (%i bytes)', filename, total)
+            await self.evict(total, filename)
+            return {
+                'url': url,
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+                'sha256': checksum.hexdigest(),
+                'size': total,
+                'checked': time.time()
+            }
+
+    async def evict(self, new_size, keep):
+        """
+        Removes the least recently used files until the total size, including a new file, is within the limit.
+        Files handed out on this run are never removed.
+        :param new_size: The size of the new file.
+        :param keep: The name of the new file, that is never removed.
+        """
+        total = new_size + sum(meta['size'] for name, meta in self.index.items() if name != keep)
+        removed = []
+        for name, meta in sorted(self.index.items(), key=lambda item: item[1].get('used', 0)):
+            if total <= self.max_size:
+                break
+            if name == keep or name in self.pinned:
+                continue
+
+            log.debug('Removing the %s file from the cache', name)
+            removed.append(name)
+            total -= meta['size']
+
+        for name in removed:
+            del self.index[name]
+        if len(removed) > 0:
+            await asyncio.to_thread(self._remove_files, removed)
+
+    async def save_index(self):
+        data = json.dumps(self.index, indent=2, sort_keys=True)
+        await asyncio.to_thread(self._write_index, data)
+
+    def _valid(self, filepath, meta, url, sha256, size):
+        if meta.get('url') != url:
+            return False
+        if sha256 is not None and meta.get('sha256') != sha256.lower():
+            return False
+        if size is not None and meta.get('size') != size:
+            return False
+
+        try:
+            return filepath.stat().st_size == meta.get('size')
+        except OSError:
+            return False
+
+    def _load_index(self):
+        try:
+            with self.index_path.open('r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning('Could not read the assets index: %s', e)
+            return {}
+
+    def _write_index(self, data):
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix('.tmp')
+            tmp_path.write_text(data, encoding='utf-8')
+            tmp_path.replace(self.index_path)
+        except OSError as e:
+            log.warning('Could not store the assets index: %s', e)
+
+    def _remove_files(self, names):
+        for name in names:
+            (self.path / name).unlink(missing_ok=True)
@@ -0,0 +1,95 @@
+import asyncio
+
+from bot import settings, imaging
+from bot.cache import DiskCache, LRUCache, SingleFlight
+from bot.web import WebClient
+from bot.workers import WorkerPool
+
+
+class AvatarCache:
+    """
+    Keeps avatars (or any other picture) already resized to a given size and PNG encoded, in memory (on a LRU
+    cache limited by the pictures size) and on disk (limited by the total files size, removing the least
+    recently used files). Pictures are identified by a key that changes along with the picture, like Discord's
+    avatar hash, so unchanged pictures are downloaded and resized only once.
+    """
+    _ins = None
+
+    def __new__(cls):
+        if cls._ins is None:
+            cls._ins = super().__new__(cls)
+        return cls._ins
+
+    def __init__(self):
+        # The instance is shared, so it's initialized only once
+        if hasattr(self, 'memory'):
+            return
+
+        self.memory = LRUCache(settings.avatar_cache_size * 1024, sizeof=len)
+        self.disk = None
+        if settings.avatar_cache_disk > 0:
+            self.disk = DiskCache(settings.base_dir / 'cache' / 'avatars', settings.avatar_cache_disk * 1024 * 1024,
+                                  suffix='.png')
+        self.flights = SingleFlight()
+        self.sizes = set()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    async def get_asset(self, asset, size=512):
+        """
+        Retrieves a Discord asset (e.g. an user's display_avatar) resized to the given size.
+        :param asset: The discord.Asset instance.
+        :param size: The picture side length, in pixels. It must be a power of 2 between 16 and 4096.
+        :return: The PNG encoded picture.
+        """
+        url = str(asset.with_static_format('png').with_size(size))
+        return await self.get(asset.key, url, size)
+
+    async def get(self, key, url, size=512):
+        """
+        Retrieves a picture resized to the given size, from the cache or downloading it.
+        :param key: The picture key. It must change when the picture changes.
+        :param url: The picture URL, used if it's not cached.
+        :param size: The picture side length, in pixels.
+        :return: The PNG encoded picture.
+        """
+        self.sizes.add(size)
+        data = self.memory.get((key, size))
+        if data is not None:
+            self.stats['hits'] += 1
+            return data
+
+        return await self.flights.run((key, size), self.load, key, url, size)
+
+    async def load(self, key, url, size):
+        data = await asyncio.to_thread(self.disk.get, (key, size)) if self.disk is not None else None
+        if data is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            async with WebClient().session().get(url) as r:
+                r.raise_for_status()
+                data = await r.read()
+
+            data = await WorkerPool().run(imaging.resize, data, size)
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.set, (key, size), data)
+
+        self.memory.set((key, size), data)
+        return data
+
+    def invalidate(self, key):
+        """
+        Removes a picture from the memory cache, on every size. Stored files are left to the disk cache limit,
+        as a changed picture has a new key.
+        :param key: The picture key.
+        """
+        self.stats['invalidations'] += 1
+        for size in self.sizes:
+            self.memory.pop((key, size))
+
+    def metrics(self):
+        requests = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+        hit_rate = (self.stats['hits'] + self.stats['disk_hits']) / requests if requests > 0 else 0
+        return {**self.stats, 'hit_rate': hit_rate, 'entries': len(self.memory), 'size': self.memory.size,
+                'evictions': self.memory.evictions, 'collapsed': self.flights.collapsed,
+                'disk_size': self.disk.size if self.disk is not None else None}
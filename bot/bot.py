@@ -3,6 +3,8 @@ import platform
 import sys
 import inspect
 import importlib
+import itertools
+import time
 from datetime import datetime
 
 import asyncio
@@ -11,6 +13,13 @@ from discord.app_commands import CommandTree
 
 from bot import GuildConfiguration, BotDatabase, Language, constants, settings, modules
 from .common import is_pm
+from .migrations import migrate
+from .router import MessageRouter
+from .scheduler import TaskScheduler
+from .assets import AssetManager
+from .avatars import AvatarCache
+from .web import WebClient
+from .workers import WorkerPool
 from bot.logger import new_logger
 from bot.utils import auto_int
 
@@ -37,7 +46,11 @@ class AlexisBot(discord.Client):
         super().__init__(**u_options, intents=intents)
 
         self.db = None
-        self.tasks_loop = asyncio.new_event_loop()
+        self.web = WebClient()
+        self.workers = WorkerPool()
+        self.avatars = AvatarCache()
+        self.assets = AssetManager()
+        self.scheduler = TaskScheduler()
         self.initialized = False
         self.start_time = datetime.now()
         self.connect_delta = None
@@ -51,14 +64,22 @@ class AlexisBot(discord.Client):
         self.cmds = {}
         self.tasks = {}
         self.swhandlers = {}
+        self.router = MessageRouter(self)
         self.cmd_instances = []
         self.mention_handlers = []
+        self.handlers = {}
+        self.handler_groups = {}
+        self.handler_stats = {}
 
         # Dinamically create and override bot event handler methods
         from bot.constants import EVENT_HANDLERS
         for method, margs in EVENT_HANDLERS.items():
             def make_handler(event_name, event_args):
                 async def dispatch(*args):
+                    # Skip events that are not handled by any module, before building its arguments
+                    if not self.initialized or not self.has_handlers(event_name):
+                        return
+
                     kwargs = dict(zip(event_args, args))
                     await self.dispatch_event(event_name=event_name, **kwargs)
 
@@ -105,6 +126,10 @@ class AlexisBot(discord.Client):
         GuildConfiguration.create_table(self.db)
         log.info('Successfully conected to database using %s', self.db.__class__.__name__)
 
+        if settings.config_preload:
+            num_guilds = GuildConfiguration.preload()
+            log.info('Configuration loaded for %i guilds', num_guilds)
+
         # Load command classes and instances from bots.modules
         log.info('Loading commands...')
         self.load_instances()
@@ -129,6 +154,9 @@ class AlexisBot(discord.Client):
 
         self.initialized = True
         self.create_tasks()
+        if settings.config_write_behind:
+            self.schedule(self.flush_config, settings.config_flush_interval)
+        self.schedule(self.flush_counters, settings.counter_flush_interval)
         await self.dispatch_event('on_ready')
 
     def load_language(self):
@@ -155,7 +183,43 @@ class AlexisBot(discord.Client):
         await super().close()
 
         # Stop tasks
-        self.cancel_tasks()
+        await self.cancel_tasks()
+
+        # Store pending configuration changes and counters
+        await self.flush_config()
+        await self.flush_counters()
+        self.db.shutdown()
+
+        # Close the HTTP sessions and stop the worker processes
+        await self.web.close()
+        self.workers.shutdown()
+
+    async def flush_config(self):
+        """
+        Stores the guild configuration changes queued on write-behind mode.
+        """
+        try:
+            num_changes = await self.db.run(GuildConfiguration.flush)
+            if num_changes > 0:
+                log.debug('%i configuration changes stored', num_changes)
+        except Exception as e:
+            log.error('Could not store the configuration changes')
+            log.exception(e)
+
+    async def flush_counters(self):
+        """
+        Stores the increments accumulated on the database counter buffers.
+        """
+        if not any(len(counter.pending()) > 0 for counter in self.db.counters.values()):
+            return
+
+        try:
+            num_counters = await self.db.run(self.db.flush_counters)
+            if num_counters > 0:
+                log.debug('%i counters stored', num_counters)
+        except Exception as e:
+            log.error('Could not store the counters')
+            log.exception(e)
 
     async def send_modlog(self, guild: discord.Guild, message=None, embed: discord.Embed = None,
                           locales=None, logtype=None):
@@ -173,7 +237,7 @@ class AlexisBot(discord.Client):
         if chanid == '':
             return
 
-        if logtype and logtype in config.get_list('logtype_disabled'):
+        if logtype and logtype in config.get_set('logtype_disabled'):
             return
 
         chan = self.get_channel(auto_int(chanid))
@@ -196,7 +260,9 @@ class AlexisBot(discord.Client):
             raise RuntimeError('destination must be a discord.abc.Messageable compatible instance')
 
         # Call pre_send_message handlers, append destination
+        kwargs['destination'] = destination
         self.dispatch_ref('pre_send_message', kwargs)
+        del kwargs['destination']
 
         # Log the message
         if isinstance(destination, discord.TextChannel):
@@ -270,6 +336,7 @@ class AlexisBot(discord.Client):
         for c in self.get_mods():
             self.cmd_instances.append(self.load_module(c))
         self.sort_instances()
+        self.register_handlers()
 
         log.info('%i modules were loaded', len(self.cmd_instances))
         log.debug('Commands loaded: ' + ', '.join(self.cmds.keys()))
@@ -305,6 +372,8 @@ class AlexisBot(discord.Client):
             else:
                 del self.swhandlers[swname]
 
+        self.router.invalidate()
+
         # Unload mention handlers
         for mhandler in self.mention_handlers:
             if mhandler.__class__.__name__ == name:
@@ -319,6 +388,7 @@ class AlexisBot(discord.Client):
 
         # Remove from instances list
         self.cmd_instances.remove(instance)
+        self.register_handlers()
         log.info('"%s" module disabled', name)
 
     def sort_instances(self):
@@ -334,7 +404,7 @@ class AlexisBot(discord.Client):
         instance = cls(self)
         db_models = getattr(cls, 'db_models', [])
         if len(db_models) > 0:
-            self.db.db.create_tables(db_models, safe=True)
+            migrate(db_models)
 
         # Commands
         for name in [instance.name] + instance.aliases:
@@ -347,6 +417,8 @@ class AlexisBot(discord.Client):
                 log.debug('Registering starts-with handler "%s"', swtext)
                 self.swhandlers[swtext] = instance
 
+        self.router.invalidate()
+
         # Commands activated with mentions
         if isinstance(instance.mention_handler, bool) and instance.mention_handler:
             self.mention_handlers.append(instance)
@@ -360,33 +432,23 @@ class AlexisBot(discord.Client):
         instances = self.cmd_instances if instance is None else [instance]
 
         for instance in instances:
-            # Scheduled (repetitive) tasks
-            if isinstance(instance.schedule, list):
-                for (task, seconds) in instance.schedule:
-                    self.schedule(task, seconds)
-            elif isinstance(instance.schedule, tuple):
-                task, seconds = instance.schedule
-                self.schedule(task, seconds)
+            # Scheduled (repetitive) tasks, as (task, seconds) or (task, seconds, options) tuples
+            schedule = instance.schedule
+            if isinstance(schedule, tuple):
+                schedule = [schedule]
 
-    async def run_task(self, task, time=0):
-        """
-        Runs a task on a given interval
-        :param task: The task function
-        :param time: The time in seconds to repeat the task
-        """
-        while 1:
-            try:
-                # log.debug('Running task %s', repr(task))
-                await task()
-            except Exception as e:
-                log.exception(e)
+            for item in schedule:
+                task, seconds = item[0], item[1]
+                options = item[2] if len(item) > 2 else {}
+                self.schedule(task, seconds, **options)
 
-    def schedule(self, task, time=0, force=False):
+    def schedule(self, task, time=0, force=False, **options):
         """
-        Adds a task to the loop to be run every *time* seconds.
+        Adds a task to the scheduler to be run every *time* seconds.
         :param task: The task function
-        :param time: The time in seconds to repeat the task
+        :param time: The time in seconds to repeat the task. If it's zero, the task is run only once.
         :param force: What to do if the task was already created. If True, the task is cancelled and created again.
+        :param options: Additional scheduling options (mode, jitter, missed, delay). See bot.scheduler for details.
         """
         if time < 0:
             raise RuntimeError('Task interval time must be positive')
@@ -397,7 +459,7 @@ class AlexisBot(discord.Client):
                 return
             self.tasks[task_name].cancel()
 
-        task_ins = self.tasks_loop.create_task(self.run_task(task, time))
+        task_ins = self.scheduler.add(task_name, task, time, **options)
         self.tasks[task_name] = task_ins
 
         if time > 0:
@@ -407,8 +469,34 @@ class AlexisBot(discord.Client):
 
         return task_ins
 
+    def register_handlers(self):
+        """
+        Builds the event handlers registry from the loaded modules. Every handler name (e.g. "on_message" or
+        "pre_on_message") is mapped to a tuple of bound methods, sorted by the modules' priority. The handlers are
+        also grouped by priority on handler_groups, as handlers with the same priority can run concurrently.
+        """
+        handlers = {}
+        for instance in self.cmd_instances:
+            for name in dir(instance):
+                if not name.startswith(('on_', 'pre_')):
+                    continue
+
+                handler = getattr(instance, name, None)
+                if callable(handler):
+                    handlers.setdefault(name, []).append(handler)
+
+        self.handlers = {name: tuple(items) for name, items in handlers.items()}
+        self.handler_groups = {
+            name: tuple(tuple(group) for _, group in itertools.groupby(items, key=lambda h: h.__self__.priority))
+            for name, items in self.handlers.items()
+        }
+        log.debug('Event handlers registered: %s', ', '.join(sorted(self.handlers.keys())))
+
     def get_handlers(self, name):
-        return [getattr(c, name, None) for c in self.cmd_instances if callable(getattr(c, name, None))]
+        return self.handlers.get(name, ())
+
+    def has_handlers(self, event_name):
+        return event_name in self.handlers or ('pre_' + event_name) in self.handlers
 
     async def dispatch_event(self, event_name, **kwargs):
         """
@@ -435,8 +523,49 @@ class AlexisBot(discord.Client):
                 else:
                     log.info('[PM] (<- %s): %s', message.author, message.content)
 
-        for z in self.get_handlers(event_name):
-            await z(**kwargs)
+        # Modules with a lower priority value run first. Handlers with the same priority run concurrently, unless
+        # EVENT_DISPATCH_CONCURRENT is disabled.
+        for group in self.handler_groups.get(event_name, ()):
+            if settings.event_dispatch_concurrent and len(group) > 1:
+                await asyncio.gather(*[self.run_handler(event_name, z, kwargs) for z in group])
+            else:
+                for z in group:
+                    await self.run_handler(event_name, z, kwargs)
+
+    async def run_handler(self, event_name, handler, kwargs):
+        """
+        Runs a module's event handler, isolating its exceptions from other handlers. The handler is cancelled when it
+        takes longer than its module's handler_timeout (EVENT_HANDLER_TIMEOUT seconds by default). The command
+        dispatchers disable it, as commands can take a long time. The handler's run time is stored on handler_stats.
+        :param event_name: Event handler name
+        :param handler: The module's bound handler method
+        :param kwargs: Event parameters
+        """
+        name = '{}.{}'.format(handler.__self__.__class__.__name__, event_name)
+        stats = self.handler_stats.get(name)
+        if stats is None:
+            stats = {'calls': 0, 'errors': 0, 'timeouts': 0, 'total_time': 0.0, 'max_time': 0.0}
+            self.handler_stats[name] = stats
+
+        timeout = handler.__self__.handler_timeout
+        start = time.perf_counter()
+        try:
+            if timeout > 0:
+                await asyncio.wait_for(handler(**kwargs), timeout)
+            else:
+                await handler(**kwargs)
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            log.warning('Event handler %s timed out after %s seconds', name, timeout)
+        except Exception as e:
+            stats['errors'] += 1
+            log.error('Event handler %s raised an exception', name)
+            log.exception(e)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
 
     def dispatch_sync(self, name, force=False, **kwargs):
         """
@@ -496,15 +625,17 @@ class AlexisBot(discord.Client):
 
                 self.cmd_instances.append(ins)
                 self.sort_instances()
+                self.register_handlers()
                 log.debug('"%s" module loaded', name)
                 return True
 
         return False
 
-    def cancel_tasks(self):
+    async def cancel_tasks(self):
         for task_name in list(self.tasks.keys()):
             self.tasks[task_name].cancel()
             del self.tasks[task_name]
+        await self.scheduler.stop()
         log.debug('All tasks cancelled.')
 
     def command_handler(self, *args, **kwargs):
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from bot.logger import new_logger
+
+
+class LRUCache:
+    """
+    A key-value cache limited by the total size of its values. When the size limit is exceeded, the least
+    recently used values are evicted.
+    """
+
+    def __init__(self, max_size, sizeof=None):
+        """
+        :param max_size: The maximum total size of the stored values.
+        :param sizeof: A function that returns the size of a value. By default, every value has a size of 1,
+        so the size limit is the amount of values.
+        """
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+
+        self._data.move_to_end(key)
+        return self._data[key][0]
+
+    def set(self, key, value):
+        """
+        Stores a value. Values larger than the cache size are not stored.
+        :param key: The value key.
+        :param value: The value.
+        """
+        self.pop(key)
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+
+        self._data[key] = (value, size)
+        self.size += size
+
+        while self.size > self.max_size:
+            _, (_, old_size) = self._data.popitem(last=False)
+            self.size -= old_size
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+
+        value, size = self._data.pop(key)
+        self.size -= size
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Runs a coroutine function only once for concurrent callers using the same key. The callers that arrive
+    while the call is in progress wait for it and get the same result or exception. The call runs on its own
+    task, so it's not interrupted if the first caller is cancelled.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._tasks = {}
+
+    async def run(self, key, func, *args, **kwargs):
+        """
+        Calls a coroutine function, or waits for the current call with the same key.
+        :param key: A hashable value that identifies the call.
+        :param func: The coroutine function.
+        :return: The call result.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.get_running_loop().create_task(func(*args, **kwargs))
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._tasks[key] = task
+        else:
+            self.collapsed += 1
+
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+        # Mark the exception as retrieved, in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self):
+        return {'calls': self.calls, 'collapsed': self.collapsed, 'in_flight': len(self._tasks)}
+
+
+class DiskCache:
+    """
+    A key-value cache stored as files on a directory, limited by the total size of the files. When the size limit
+    is exceeded, the least recently used files (by modification time, updated on every read) are removed.
+    Its methods are blocking, so they should be run outside the event loop (e.g. with asyncio.to_thread).
+    """
+
+    def __init__(self, path, max_size, suffix='.bin'):
+        """
+        :param path: The directory path. It's created when the first value is stored.
+        :param max_size: The maximum total size of the files, in bytes.
+        :param suffix: The files extension.
+        """
+        self.path = Path(path)
+        self.max_size = max_size
+        self.suffix = suffix
+        self.size = None
+        # The methods can run on several threads at once, so the size is updated with this lock
+        self._lock = threading.Lock()
+        self.log = new_logger('DiskCache')
+
+    def file(self, key):
+        return self.path / (hashlib.sha1(str(key).encode('utf-8')).hexdigest() + self.suffix)
+
+    def get(self, key):
+        file = self.file(key)
+        try:
+            data = file.read_bytes()
+            # Mark the file as recently used
+            os.utime(file)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self.log.warning('Could not read the cached file %s: %s', file, e)
+            return None
+
+    def set(self, key, value):
+        """
+        Stores a value. The file is written on a temporary file first, so readers never get partial values.
+        :param key: The value key.
+        :param value: The value, as bytes.
+        """
+        file = self.file(key)
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if self.size is None:
+                    self.size = sum(f.stat().st_size for f in self.path.glob('*' + self.suffix))
+
+            tmp_file = file.with_suffix('.tmp')
+            tmp_file.write_bytes(value)
+            # A replaced file does not count anymore
+            old_size = self._file_size(file)
+            tmp_file.replace(file)
+            with self._lock:
+                self.size += len(value) - old_size
+        except OSError as e:
+            self.log.warning('Could not store the cached file %s: %s', file, e)
+            return
+
+        if self.size > self.max_size:
+            self.prune()
+
+    def pop(self, key):
+        file = self.file(key)
+        size = self._file_size(file)
+        try:
+            file.unlink()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.log.warning('Could not remove the cached file %s: %s', file, e)
+            return
+
+        with self._lock:
+            if self.size is not None:
+                self.size -= size
+
+    def prune(self):
+        """
+        Removes the least recently used files, until the cache uses 90% of its limit.
+        """
+        files = []
+        for file in self.path.glob('*' + self.suffix):
+            try:
+                stat = file.stat()
+                files.append((stat.st_mtime, stat.st_size, file))
+            except OSError:
+                pass
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if total <= self.max_size * 0.9:
+                break
+
+            file.unlink(missing_ok=True)
+            total -= size
+
+        with self._lock:
+            self.size = total
+
+    @staticmethod
+    def _file_size(file):
+        try:
+            return file.stat().st_size
+        except FileNotFoundError:
+            return 0
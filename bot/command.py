@@ -1,6 +1,5 @@
 from __future__ import annotations
 from logging import Logger
-import aiohttp
 
 import discord
 
@@ -22,7 +21,7 @@ class Command:
         self.bot = bot
         self.name = ''  # Command name
         self.aliases = []  # Command aliases
-        self.schedule = []
+        self.schedule = []  # (task, seconds) or (task, seconds, options) tuples
         self.swhandler = []
         self.swhandler_break = False
         self.mention_handler = False
@@ -34,8 +33,10 @@ class Command:
         self.default_enabled = True
         self.default_config = None
         self.priority = 100
+        self.handler_timeout = settings.event_handler_timeout  # Seconds before cancelling event handlers (0: never)
         self.user_delay = 0
         self.users_delay = {}
+        self.http_cache_ttl = 0  # Seconds to keep the responses retrieved with fetch
 
         # Default messages and error messages
         self.help = '$[help-not-available]'
@@ -76,16 +77,35 @@ class Command:
     @lazy_property
     def http(self):
         """
-        Creates a http session instance with its own cookie storage and user-agent.
+        Retrieves a http session with its own cookie storage and user-agent, that uses the bot's
+        shared connection pool. The session is closed by the bot, so it must not be closed by the module.
         :return: The http session instance.
         """
-        headers = {'User-Agent': '{}/{} {}/{} (https://alexisbot.mak.wtf/)'.format(
+        user_agent = '{}/{} {}/{} (https://alexisbot.mak.wtf/)'.format(
             self.__class__.__name__, self.__class__.__version__,
-            self.bot.__class__.name, self.bot.__class__.__version__)}
+            self.bot.__class__.name, self.bot.__class__.__version__)
 
-        return aiohttp.ClientSession(
-            headers=headers, cookie_jar=aiohttp.CookieJar(unsafe=True)
-        )
+        return self.bot.web.session(self.__class__.__name__, user_agent=user_agent)
+
+    async def fetch(self, url, ttl=None, **kwargs):
+        """
+        Makes a request with the module's http session and reads its response, using the bot's response cache.
+        :param url: The request URL.
+        :param ttl: The time in seconds to keep the response. By default, the module's http_cache_ttl is used.
+        :param kwargs: Other WebClient.fetch options, like method, stale_ttl and the request options.
+        :return: A bot.web.CachedResponse instance.
+        """
+        ttl = self.http_cache_ttl if ttl is None else ttl
+        return await self.bot.web.fetch(self.http, url, ttl, **kwargs)
+
+    async def run_worker(self, func, *args, **kwargs):
+        """
+        Runs a CPU-bound function on the bot's worker process pool, so it doesn't block the event loop.
+        :param func: A module-level function, with picklable arguments and result (e.g. from bot.imaging).
+        :return: The function's result.
+        :raises bot.workers.WorkersBusyError: If the worker pool is full.
+        """
+        return await self.bot.workers.run(func, *args, **kwargs)
 
     @lazy_property
     def log(self) -> Logger:
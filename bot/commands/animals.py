@@ -1,5 +1,4 @@
 from typing import Union
-import aiohttp
 import discord
 from .. import bot, log
 
@@ -35,20 +34,19 @@ def parse_item_result(cmd_type: str, data: Union[dict, list]) -> str:
 
 async def animal_interaction(cmd_type: str, interaction: discord.Interaction):
     c_url, c_name, _ = cmd_settings[cmd_type]
-    async with aiohttp.ClientSession() as session:
-        async with session.get(c_url) as r:
-            if r.status == 200:
-                data = await r.json()
-                img_url = parse_item_result(cmd_type, data)
-                if cmd_type == 'cat':
-                    img_url = f'https://cataas.com/cat/{img_url}'
-                if img_url.endswith('.gifv'):
-                    img_url = img_url[:-4] + 'mp4'
-                embed = discord.Embed(title=f'Aquí tienes tu {c_name}')
-                embed.set_image(url=img_url)
-                await interaction.response.send_message(embed=embed)
-            else:
-                log.error('[animals][%s] status %i heck', c_name, r.status)
+    async with bot.web.session().get(c_url) as r:
+        if r.status == 200:
+            data = await r.json()
+            img_url = parse_item_result(cmd_type, data)
+            if cmd_type == 'cat':
+                img_url = f'https://cataas.com/cat/{img_url}'
+            if img_url.endswith('.gifv'):
+                img_url = img_url[:-4] + 'mp4'
+            embed = discord.Embed(title=f'Aquí tienes tu {c_name}')
+            embed.set_image(url=img_url)
+            await interaction.response.send_message(embed=embed)
+        else:
+            log.error('[animals][%s] status %i heck', c_name, r.status)
 
 
 for animal in cmd_settings.keys():
@@ -3,7 +3,6 @@ from random import choice
 import json
 from xml.etree.ElementTree import fromstring as parsexml
 
-import aiohttp
 import discord
 
 from .. import bot, log
@@ -56,34 +55,33 @@ async def cmd_handler(cmd_type: str, interaction: discord.Interaction, query: st
     c_url = conf['url'].format(query)
     await interaction.channel.typing()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(c_url) as r:
-            if r.status != 200:
-                log.error('[booru][%s] status %i heck', cmd_type, r.status)
-                return
+    async with bot.web.session().get(c_url) as r:
+        if r.status != 200:
+            log.error('[booru][%s] status %i heck', cmd_type, r.status)
+            return
 
-            result = await r.text()
-            if result.startswith('<'):
-                posts = parsexml(result).findall('post')
-            else:
-                posts = json.loads(result)
-                if cmd_type == 'e621':
-                    posts = filter(lambda x: x['file']['ext'] != 'webm', posts['posts'])
+        result = await r.text()
+        if result.startswith('<'):
+            posts = parsexml(result).findall('post')
+        else:
+            posts = json.loads(result)
+            if cmd_type == 'e621':
+                posts = filter(lambda x: x['file']['ext'] != 'webm', posts['posts'])
 
-            if len(posts) == 0:
-                await interaction.response.send_message('Sin resultados', ephemeral=True)
-                return
+        if len(posts) == 0:
+            await interaction.response.send_message('Sin resultados', ephemeral=True)
+            return
 
-            post = choice(posts)
-            image_url = post['file']['url'] if cmd_type == 'e621' else post.get('file_url')
+        post = choice(posts)
+        image_url = post['file']['url'] if cmd_type == 'e621' else post.get('file_url')
 
-            if image_url.startswith('//'):
-                image_url = f'https:{image_url}'
+        if image_url.startswith('//'):
+            image_url = f'https:{image_url}'
 
-            site_name = conf.get('name', cmd_type)
-            embed = discord.Embed(title=f'Resultado de la búsqueda en {site_name}')
-            embed.set_image(url=image_url)
-            await interaction.response.send_message(embed=embed)
+        site_name = conf.get('name', cmd_type)
+        embed = discord.Embed(title=f'Resultado de la búsqueda en {site_name}')
+        embed.set_image(url=image_url)
+        await interaction.response.send_message(embed=embed)
 
 
 for search_type, conf in search_types.items():
@@ -20,7 +20,7 @@ def is_owner(bot, member: discord.Member):
 
     # Check if the user has the owner role
     cfg = GuildConfiguration.get_instance(member.guild)
-    owner_roles = cfg.get_list('owner_roles', [settings.owner_role])
+    owner_roles = cfg.get_set('owner_roles', [settings.owner_role])
     for role in member.roles:
         if str(role.id) in owner_roles \
                 or role.name in owner_roles \
@@ -1,4 +1,10 @@
+import asyncio
+import functools
 import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from playhouse.db_url import connect
 
@@ -10,6 +16,10 @@ peewee_log.setLevel(logging.INFO)
 
 
 class BotDatabase:
+    """
+    Holds the database connection used by all the models. Blocking queries can be run outside the event loop
+    with the `run` coroutine, which uses a dedicated thread pool. Every pool thread keeps its own connection.
+    """
     _ins = None
 
     def __new__(cls):
@@ -18,9 +28,192 @@ class BotDatabase:
         return cls._ins
 
     def __init__(self):
+        # The instance is shared, so it's initialized only once
+        if hasattr(self, 'db'):
+            return
+
         dburl = settings.database_url
         if dburl.startswith('mysql:'):
             dburl += '&amp;' if '?' in dburl else '?'
             dburl += 'charset=utf8mb4;'
 
         self.db = connect(dburl, autorollback=True)
+
+        # SQLite does not handle concurrent writes, so it uses a single thread by default
+        threads = settings.database_threads or (1 if dburl.startswith('sqlite') else 4)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='database')
+        self.stats = {}
+        self.sync_calls = 0
+        self._stats_lock = threading.Lock()
+        self.counters = {}
+
+        if settings.database_warn_sync:
+            self._watch_sync_calls()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking database function (a query execution, a model method, etc.) on the database thread pool.
+        For example: `await db.run(Model.get, Model.id == 1)` or `await db.run(list, Model.select())`.
+        :param func: The function to call.
+        :return: The function's result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self._run, func, args, kwargs))
+
+    def _run(self, func, args, kwargs):
+        self.db.connect(reuse_if_open=True)
+
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            name = getattr(func, '__qualname__', repr(func))
+            self._add_stat(name, elapsed)
+
+            if elapsed * 1000 > settings.database_slow_query:
+                peewee_log.warning('Slow database call %s took %.3f seconds', name, elapsed)
+
+    def _add_stat(self, name, elapsed):
+        with self._stats_lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0}
+
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+
+    def _watch_sync_calls(self):
+        """
+        Logs every query executed directly on the event loop's thread, with the stack that called it,
+        to find the queries that are not run through `run`.
+        """
+        execute_sql = self.db.execute_sql
+
+        def execute_sql_watched(sql, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                self.sync_calls += 1
+                stack = ''.join(traceback.format_stack(limit=8)[:-1])
+                peewee_log.warning('Synchronous query on the event loop: %s\n%s', sql, stack)
+
+            return execute_sql(sql, *args, **kwargs)
+
+        self.db.execute_sql = execute_sql_watched
+
+    def counter(self, name, store):
+        """
+        Creates (or returns, if it already exists) a write-behind counter buffer.
+        :param name: The buffer name.
+        :param store: The function that stores a counter increment. See CounterBuffer.
+        :return: The CounterBuffer instance.
+        """
+        if name not in self.counters:
+            self.counters[name] = CounterBuffer(self, name, store)
+        return self.counters[name]
+
+    def flush_counters(self):
+        """
+        Stores the pending increments of every counter buffer. This is a blocking call, so it should
+        be run through `run`.
+        :return: The amount of stored counters.
+        """
+        total = 0
+        for counter in list(self.counters.values()):
+            try:
+                total += counter.flush()
+            except Exception as e:
+                peewee_log.error('Could not store the "%s" counters', counter.name)
+                peewee_log.exception(e)
+
+        return total
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class CounterBuffer:
+    """
+    Accumulates counter increments in memory, so frequently updated counters are written on a single
+    batched transaction every few seconds, instead of on every increment. Counters are identified by a
+    key, and can carry extra data (the last value wins), that is passed along the increment when stored.
+    Readers can get the pending increments to merge them with the stored values.
+    """
+
+    def __init__(self, database, name, store):
+        """
+        :param database: The BotDatabase instance.
+        :param name: The buffer name, used for logging.
+        :param store: A function that receives a counter's key, its accumulated increment and its extra data,
+        and stores them. It's called inside a transaction.
+        """
+        self.database = database
+        self.name = name
+        self.store = store
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1, **data):
+        """
+        Adds an increment to a counter.
+        :param key: The counter key.
+        :param amount: The amount to add.
+        :param data: Extra data for the counter.
+        :return: The counter's total pending increment.
+        """
+        with self._lock:
+            delta, prev_data = self._pending.get(key, (0, {}))
+            prev_data.update(data)
+            self._pending[key] = (delta + amount, prev_data)
+            return delta + amount
+
+    def get(self, key):
+        """
+        :param key: The counter key.
+        :return: The counter's pending increment.
+        """
+        return self._pending.get(key, (0, None))[0]
+
+    def pending(self):
+        """
+        :return: A dict with the pending (increment, data) tuples, by key.
+        """
+        with self._lock:
+            return dict(self._pending)
+
+    def discard(self, key):
+        """
+        Drops a counter's pending increment, e.g. when the stored value is replaced.
+        :param key: The counter key.
+        """
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def flush(self):
+        """
+        Stores all the pending increments on a single transaction. If the transaction fails, the increments
+        are merged back into the buffer, so they're stored on the next flush.
+        :return: The amount of stored counters.
+        """
+        with self._lock:
+            if len(self._pending) == 0:
+                return 0
+            pending, self._pending = self._pending, {}
+
+        try:
+            with self.database.db.atomic():
+                for key, (delta, data) in pending.items():
+                    self.store(key, delta, data)
+        except Exception:
+            with self._lock:
+                for key, (delta, data) in pending.items():
+                    new_delta, new_data = self._pending.get(key, (0, {}))
+                    data.update(new_data)
+                    self._pending[key] = (delta + new_delta, data)
+            raise
+
+        return len(pending)
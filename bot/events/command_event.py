@@ -2,9 +2,8 @@ from datetime import timedelta, datetime
 
 import discord
 
-from bot import GuildConfiguration, settings
 from bot.events.message_event import MessageEvent
-from bot.utils import serialize_avail, no_tags
+from bot.utils import no_tags
 from ..regex import pat_usertag
 
 
@@ -13,10 +12,10 @@ class CommandEvent(MessageEvent):
         super().__init__(message, bot)
 
         # Command definition
+        route = bot.router.match(message)
         self.allargs = message.content.replace('  ', ' ').split(' ')
-        cmd_parts = self.allargs[0][len(self.prefix):].split(':')
-        self.cmdname = cmd_parts[0]
-        self.subcmd = '' if len(cmd_parts) < 2 else cmd_parts[1]
+        self.cmdname = route.cmdname
+        self.subcmd = route.subcmd
 
         # Arguments definition
         self.args = [] if len(self.allargs) == 1 else [f for f in self.allargs[1:] if f.strip() != '']
@@ -41,8 +40,7 @@ class CommandEvent(MessageEvent):
         if self.is_pm:
             return True
 
-        data_db = self.config.get('cmd_status', '')
-        avail = serialize_avail(data_db)
+        avail = self.config.get_avail('cmd_status')
         cmd = self.bot.get_cmd(self.cmdname)
         enabled_db = avail.get(cmd.name, '+' if cmd.default_enabled else '-')
         return enabled_db == '+'
@@ -99,13 +97,4 @@ class CommandEvent(MessageEvent):
 
     @staticmethod
     def is_command(message, bot):
-        if isinstance(message.channel, discord.DMChannel):
-            prefix = settings.command_prefix
-        else:
-            prefix = GuildConfiguration.get_instance(message.channel.guild).prefix
-
-        if message.content.startswith(prefix):
-            cmdname = message.content[len(prefix):].split(' ')[0].split(':')[0]
-            return bot.has_cmd(cmdname)
-        else:
-            return False
+        return bot.router.match(message).command is not None
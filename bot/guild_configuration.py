@@ -1,7 +1,11 @@
+from types import MappingProxyType
+
 import peewee
 from discord import Guild
 
 from bot import settings
+from bot.migrations import add_indexes, migrate
+from bot.utils import serialize_avail
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -9,13 +13,15 @@ if TYPE_CHECKING:
 
 
 class ServerConfig(peewee.Model):
-    serverid = peewee.TextField()
-    name = peewee.TextField()
+    serverid = peewee.CharField(max_length=32)
+    name = peewee.CharField(max_length=100)
     value = peewee.TextField(default='')
+    schema_migrations = [add_indexes]
 
     class Meta:
         from bot.database import BotDatabase
         database = BotDatabase().db
+        indexes = ((('serverid', 'name'), True),)
 
 
 class GuildConfiguration:
@@ -26,12 +32,17 @@ class GuildConfiguration:
     stored on the database. Also, this is made assuming that the database will not be changed during runtime,
     and the in-memory values are used. Values in memory are changed if the configurations are only changed
     with this class and are not synced by using getters.
+    Parsed values (lists, sets, booleans, integers and dicts) are cached until the configuration value is changed.
+    If all the configurations are preloaded, guilds without stored values don't need a query to be created.
+    With the write-behind mode, changes are queued and stored in batches by the `flush` method.
     """
 
     _global_id = 'all'
     _list_separator = ','
     _comma_escape = '\1\1'
     _instances = {}
+    _preloaded = False
+    _pending = {}
 
     @classmethod
     def get_instance(cls, guild: Guild = None, defaults=None):
@@ -43,7 +54,7 @@ class GuildConfiguration:
         """
         guild_id = cls._global_id if guild is None else str(guild.id)
         if guild_id not in cls._instances:
-            cls._instances[guild_id] = cls(guild, None)
+            cls._instances[guild_id] = cls(guild, None, {} if cls._preloaded else None)
         else:
             cls._instances[guild_id].set_defaults(defaults)
 
@@ -51,7 +62,59 @@ class GuildConfiguration:
 
     @classmethod
     def create_table(cls, db: 'BotDatabase'):
-        db.db.create_tables([ServerConfig], safe=True)
+        migrate([ServerConfig])
+
+    @classmethod
+    def preload(cls):
+        """
+        Loads all the stored configurations with a single query, and creates the instances for those guilds.
+        Once loaded, the instances for guilds without stored configurations are created without a query.
+        :return: The amount of guilds loaded.
+        """
+        configs = {}
+        query = ServerConfig.select(ServerConfig.serverid, ServerConfig.name, ServerConfig.value).tuples()
+        for guild_id, name, value in query:
+            configs.setdefault(guild_id, {})[name] = value
+
+        for guild_id, config in configs.items():
+            if guild_id not in cls._instances:
+                cls._instances[guild_id] = cls(guild_id, None, config)
+
+        cls._preloaded = True
+        return len(configs)
+
+    @classmethod
+    def flush(cls):
+        """
+        Stores the queued configuration changes made on write-behind mode, in a single transaction.
+        If the changes could not be stored, they are queued again, unless they were changed meanwhile.
+        :return: The amount of changes stored.
+        """
+        if len(cls._pending) == 0:
+            return 0
+
+        pending, cls._pending = cls._pending, {}
+        by_guild = {}
+        for (guild_id, name), value in pending.items():
+            by_guild.setdefault(guild_id, []).append(name)
+
+        rows = [{'serverid': guild_id, 'name': name, 'value': value}
+                for (guild_id, name), value in pending.items() if value is not None]
+
+        try:
+            with ServerConfig._meta.database.atomic():
+                for guild_id, names in by_guild.items():
+                    ServerConfig.delete().where(
+                        (ServerConfig.serverid == guild_id) & ServerConfig.name.in_(names)).execute()
+
+                for batch in peewee.chunked(rows, 100):
+                    ServerConfig.insert_many(batch).execute()
+        except Exception:
+            for key, value in pending.items():
+                cls._pending.setdefault(key, value)
+            raise
+
+        return len(pending)
 
     @classmethod
     def get_all(cls, guild_id=None):
@@ -77,8 +140,12 @@ class GuildConfiguration:
         if not guild_id:
             guild_id = cls._global_id
 
+        guild_id = str(guild_id)
+        if guild_id in cls._instances:
+            return cls._instances[guild_id].get(name, default)
+
         try:
-            config = ServerConfig.get(ServerConfig.serverid == guild_id and ServerConfig.name == name)
+            config = ServerConfig.get((ServerConfig.serverid == guild_id) & (ServerConfig.name == name))
             return config.value
         except ServerConfig.DoesNotExist:
             return default
@@ -92,6 +159,10 @@ class GuildConfiguration:
         :param value: The value to be set for the configuration.
         :return: The value set.
         """
+        if settings.config_write_behind:
+            cls._pending[(str(guild_id), name)] = value
+            return value
+
         config, created = ServerConfig.get_or_create(
             serverid=guild_id, name=name, defaults={'value': value}
         )
@@ -102,15 +173,21 @@ class GuildConfiguration:
 
         return config.value
 
-    def __init__(self, guild: Guild = None, defaults=None):
+    def __init__(self, guild: Guild = None, defaults=None, config=None):
         """
-        :param guild: The discord.Server instance or server ID
+        :param guild: The discord.Guild instance or guild ID
         :param defaults: A `dict` of default values that will be return for a configuration
         name if the default value is not passed on the `get` method.
+        :param config: The already loaded configuration values. If not set, they are loaded from the database.
         """
-        self.guild_id = str(guild.id) if guild is not None else self._global_id
-        self._config = self.get_all(self.guild_id)
+        if guild is None:
+            self.guild_id = self._global_id
+        else:
+            self.guild_id = str(guild.id) if isinstance(guild, Guild) else str(guild)
+
+        self._config = self.get_all(self.guild_id) if config is None else config
         self._defaults = {}
+        self._views = {}
 
         if defaults:
             self.set_defaults(defaults)
@@ -144,7 +221,7 @@ class GuildConfiguration:
         :param default: The default value to use if the configuration does not exist
         :return: The requested configuration value.
         """
-        default = default if default is not None else self.get_value(name, self._defaults.get(name, default))
+        default = default if default is not None else self._defaults.get(name)
         return self._config.get(name, default)
 
     def set(self, name, value):
@@ -155,6 +232,7 @@ class GuildConfiguration:
         :return: The stored value.
         """
         self._config[name] = self.set_value(self.guild_id, name, value)
+        self._views.pop(name, None)
         return self._config[name]
 
     def unset(self, name):
@@ -166,10 +244,17 @@ class GuildConfiguration:
         if not self.has(name):
             return False
 
+        if settings.config_write_behind:
+            self._pending[(self.guild_id, name)] = None
+            del self._config[name]
+            self._views.pop(name, None)
+            return True
+
         try:
             ins = ServerConfig.get(serverid=self.guild_id, name=name)
             ins.delete_instance()
             del self._config[name]
+            self._views.pop(name, None)
             return True
         except ServerConfig.DoesNotExist:
             return False
@@ -192,10 +277,23 @@ class GuildConfiguration:
         if not self.has(name):
             return default
 
-        val = self.get(name, '')
-        val_list = default if val == '' else val.split(self._list_separator)
-        val_list = [i.replace(self._comma_escape, ',') for i in val_list]
-        return val_list
+        if self.get(name, '') == '':
+            return list(default)
+
+        return list(self._view(name, 'list', None, self._parse_list))
+
+    def get_set(self, name, default=None):
+        """
+        Fetches a configuration value as a comma separated list, like `get_list`, but as a cached frozenset,
+        useful for membership checks. The returned set must not be changed.
+        :param name: The configuration value name.
+        :param default: The default values if it does not exist.
+        :return: The requested configuration as a frozenset
+        """
+        if not self.has(name) or self.get(name, '') == '':
+            return frozenset(default or [])
+
+        return self._view(name, 'set', None, lambda val: frozenset(self._parse_list(val)))
 
     def set_list(self, name, elements):
         """
@@ -219,7 +317,38 @@ class GuildConfiguration:
         :param name: The name of the value to fetch
         :param default: The default value to use.
         """
-        return self.get(name, default=str(int(bool(default)))) == '1'
+        default = bool(default)
+        if not self.has(name):
+            return default
+
+        return self._view(name, 'bool', default, lambda val: val == '1')
+
+    def get_int(self, name, default=0):
+        """
+        Retrieve a value as an integer. If the value does not exist or it's not a valid integer,
+        the default value is returned.
+        :param name: The name of the value to fetch
+        :param default: The default value to use.
+        """
+        if not self.has(name):
+            return default
+
+        def parse_int(val):
+            try:
+                return int(val)
+            except (ValueError, TypeError):
+                return default
+
+        return self._view(name, 'int', default, parse_int)
+
+    def get_avail(self, name):
+        """
+        Retrieve a value serialized with `bot.utils.unserialize_avail` (e.g. the commands status) as a cached,
+        read-only dict.
+        :param name: The name of the value to fetch
+        :return: A read-only mapping with the parsed values.
+        """
+        return self._view(name, 'avail', None, lambda val: MappingProxyType(serialize_avail(val or '')))
 
     def set_bool(self, name, value):
         """
@@ -276,6 +405,27 @@ class GuildConfiguration:
         self.set_list(name, values)
         return values
 
+    def _parse_list(self, val):
+        return tuple(i.replace(self._comma_escape, ',') for i in val.split(self._list_separator))
+
+    def _view(self, name, kind, default, parser):
+        """
+        Returns a parsed configuration value, caching it until the value is changed.
+        :param name: The configuration value name.
+        :param kind: The parsed value type name.
+        :param default: The default value used by the parser, if any. Must be hashable.
+        :param parser: The function that parses the raw configuration value.
+        """
+        views = self._views.get(name)
+        if views is None:
+            views = self._views[name] = {}
+
+        key = (kind, default)
+        if key not in views:
+            views[key] = parser(self._config.get(name))
+
+        return views[key]
+
     # Specific values
 
     @property
@@ -0,0 +1,178 @@
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+# CPU-bound image functions, meant to be run on the worker pool (see bot.workers). They receive and return
+# encoded images as bytes, so their arguments and results can be sent between processes.
+
+# Outline width of the meme texts. The line spacing is reduced to keep the lines as close as without outline,
+# as Pillow adds the outline width to the line height.
+meme_stroke = 2
+meme_spacing = 4 - meme_stroke * 2
+# Meme texts use the largest font size that fits them in this amount of lines
+meme_max_lines = 2
+
+
+@lru_cache(maxsize=32)
+def load_font(path, size):
+    # Fonts are kept by every worker process, so they're only read once per process
+    return ImageFont.truetype(path, size=size)
+
+
+def encode_png(im):
+    temp = BytesIO()
+    im.save(temp, format='PNG')
+    return temp.getvalue()
+
+
+def meme(avatar, font_path, size, lower, upper=''):
+    """
+    Draws meme texts over an avatar.
+    :param avatar: The encoded avatar picture.
+    :param font_path: The path of the font file.
+    :param size: The side length of the resulting picture.
+    :param lower: The bottom text.
+    :param upper: The top text. If it's empty, it's not drawn.
+    :return: The PNG encoded picture.
+    """
+    avatar_img = Image.open(BytesIO(avatar)).resize((size, size), Image.LANCZOS)
+    im = Image.new('RGBA', (size, size))
+    im.paste(avatar_img, (0, 0))
+
+    meme_draw(im, size, font_path, lower, upper=False)
+    if upper:
+        meme_draw(im, size, font_path, upper)
+
+    return encode_png(im)
+
+
+def meme_draw(im, size, font_path, text, upper=True):
+    sep = int(size / 23)
+    font_size, text, width, height = layout_text(font_path, text, size - sep, int(size / 14), int(size / 8))
+    xy = (int(size / 2)) - int(width / 2), (15 if upper else size - sep - height)
+
+    # The text and its outline are drawn at once
+    draw = ImageDraw.Draw(im)
+    draw.multiline_text(xy, text, font=load_font(font_path, font_size), align='center', fill='white',
+                        spacing=meme_spacing, stroke_width=meme_stroke, stroke_fill='black')
+
+
+@lru_cache(maxsize=4096)
+def word_length(font_path, size, word):
+    return load_font(font_path, size).getlength(word)
+
+
+def wrap_words(widths, space, max_width):
+    """
+    Splits a list of words into lines no wider than the given width, filling each line with as many words as
+    possible. Words wider than the width are left on their own line.
+    :param widths: The widths of the words.
+    :param space: The width of a space.
+    :param max_width: The maximum line width.
+    :return: The list of lines, as (first word index, last word index + 1) tuples.
+    """
+    if len(widths) == 0:
+        return []
+
+    # The width of a line from the word i to the word j (inclusive) is prefix[j + 1] - prefix[i] plus the
+    # spaces between them.
+    prefix = [0.0]
+    for width in widths:
+        prefix.append(prefix[-1] + width)
+
+    lines = []
+    start = 0
+    for end in range(1, len(widths)):
+        if prefix[end + 1] - prefix[start] + space * (end - start) > max_width:
+            lines.append((start, end))
+            start = end
+
+    lines.append((start, len(widths)))
+    return lines
+
+
+@lru_cache(maxsize=1024)
+def layout_text(font_path, text, max_width, min_size, max_size):
+    """
+    Picks the largest font size, between min_size and max_size, that fits a text in meme_max_lines lines no wider
+    than max_width, and wraps and measures the text with it. Texts that don't fit use min_size with more lines.
+    Glyph widths grow along with the font size, so the words are measured only once, with max_size, and their
+    widths on the other sizes are derived from those.
+    :return: A tuple with the font size, the wrapped text, and the width and height of the block drawn with the
+    meme outline.
+    """
+    words = text.split()
+    widths = [word_length(font_path, max_size, word) for word in words]
+    space = word_length(font_path, max_size, ' ')
+
+    def wrap(font_size):
+        scale = font_size / max_size
+        return wrap_words([width * scale for width in widths], space * scale, max_width)
+
+    # Binary search of the largest size that fits
+    font_size, lines = min_size, None
+    low, high = min_size, max_size
+    while low <= high:
+        mid = (low + high) // 2
+        mid_lines = wrap(mid)
+        if len(mid_lines) <= meme_max_lines:
+            font_size, lines = mid, mid_lines
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    if lines is None:
+        lines = wrap(min_size)
+
+    text = '\n'.join(' '.join(words[start:end]) for start, end in lines)
+    draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+    _, _, width, height = draw.multiline_textbbox(
+        (0, 0), text, font=load_font(font_path, font_size), spacing=meme_spacing, stroke_width=meme_stroke)
+    return font_size, text, width, height
+
+
+def resize(image, size):
+    """
+    Resizes a picture to a square.
+    :param image: The encoded picture.
+    :param size: The side length of the resulting picture.
+    :return: The PNG encoded picture.
+    """
+    im = Image.open(BytesIO(image)).resize((size, size), Image.LANCZOS)
+    temp = BytesIO()
+    # Resized pictures are usually cached, so they're encoded quickly instead of compressed
+    im.save(temp, format='PNG', compress_level=1)
+    return temp.getvalue()
+
+
+def ship(avatar1, avatar2, heart_path):
+    """
+    Joins two avatars with a heart between them.
+    :param avatar1: The encoded left picture.
+    :param avatar2: The encoded right picture.
+    :param heart_path: The path of the heart picture.
+    :return: The PNG encoded picture.
+    """
+    user1_img = Image.open(BytesIO(avatar1)).resize((512, 512), Image.LANCZOS)
+    user2_img = Image.open(BytesIO(avatar2)).resize((512, 512), Image.LANCZOS)
+    heart_img = Image.open(heart_path)
+
+    result = Image.new('RGBA', (1536, 512))
+    result.paste(user1_img, (0, 0))
+    result.paste(heart_img, (512, 0))
+    result.paste(user2_img, (1024, 0))
+
+    return encode_png(result)
+
+
+def add_border(image, border, fill):
+    """
+    Adds a border around a picture.
+    :param image: The encoded picture.
+    :param border: The border width, in pixels.
+    :param fill: The border color.
+    :return: The PNG encoded picture.
+    """
+    image_data = Image.open(BytesIO(image))
+    return encode_png(ImageOps.expand(image_data, border=border, fill=fill))
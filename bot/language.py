@@ -1,4 +1,9 @@
+import hashlib
+import marshal
+import os
 import re
+import sys
+from string import Formatter
 
 from ruamel.yaml import YAML
 from discord import Embed
@@ -7,60 +12,212 @@ from bot import settings
 from bot.logger import new_logger
 
 pat_lang_placeholder = re.compile(r'\$\[([a-zA-Z0-9_\-]+)\]')
+pat_message_token = re.compile(r'\$(?:AU|CMD|NM|PX)')
 log = new_logger('Language')
+formatter = Formatter()
+
+
+class Template:
+    """
+    A language string compiled into a list of (literal text, locale name) segments, so it can be rendered
+    in a single pass. Strings with fields that are not plain locale names (positional fields, attributes,
+    conversions or format specs) are rendered with `str.format`. The result without locales is precomputed.
+    """
+    __slots__ = ('text', 'segments', 'plain')
+
+    def __init__(self, text):
+        self.text = text
+        self.segments = []
+        self.plain = None
+
+        try:
+            for literal, field, spec, conversion in formatter.parse(text):
+                if field is not None and (not field.isidentifier() or spec or conversion):
+                    self.segments = None
+                    break
+
+                self.segments.append((literal, field))
+        except ValueError:
+            self.segments = None
+
+        if self.segments is not None:
+            has_fields = any(field is not None for _, field in self.segments)
+            # Without locales, a string with fields fails to format and is returned as it is
+            self.plain = self.text if has_fields else ''.join(literal for literal, _ in self.segments)
+
+    def render(self, kwargs):
+        """
+        Formats the string with the given locales, like `str.format`. If a locale is missing, the
+        string is returned without formatting.
+        :param kwargs: The locales dict.
+        :return: The formatted string.
+        """
+        if not kwargs and self.plain is not None:
+            return self.plain
+
+        if self.segments is None:
+            try:
+                return self.text.format(**kwargs)
+            except KeyError:
+                return self.text
+
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                if field not in kwargs:
+                    return self.text
+                parts.append(format(kwargs[field]))
+
+        return ''.join(parts)
 
 
 class Language:
+    # Increment when the bundle's contents change
+    bundle_version = 1
+
     def __init__(self, default='en', autoload=False):
         self.lib = {}
         self.path = settings.base_dir / 'lang'
+        self.bundle_path = settings.base_dir / 'cache' / 'lang.bundle'
         self.default = default
+        self.templates = {}
+        self.format_cache = {}
+        self._templates_default = None
 
         if autoload:
             self.load()
 
     def load(self):
+        """
+        Loads the language files. The parsed files are kept on a bundle file, so only the files that changed
+        since the last load are parsed again. A file is considered changed if its modification time or size
+        changed, and its content hash is different.
+        """
         self.lib = {}
-        lang_files = self.path.glob('**/*.yml')
+        bundle = self.load_bundle() if settings.lang_bundle else {}
+        files = {}
+        num_parsed = 0
 
-        for lang_file in lang_files:
+        for lang_file in self.path.glob('**/*.yml'):
             if not lang_file.is_file() or not lang_file.name.endswith('.yml'):
                 continue
 
-            with lang_file.open(encoding='utf8') as f:
-                yml = YAML(typ='safe')
-                data = dict(yml.load(f))
-                lang = lang_file.name[:-4]
+            relpath = lang_file.relative_to(self.path).as_posix()
+            fstat = lang_file.stat()
+            entry = bundle.get(relpath)
+
+            if entry is None or entry['mtime'] != fstat.st_mtime_ns or entry['size'] != fstat.st_size:
+                content = lang_file.read_bytes()
+                digest = hashlib.sha1(content).hexdigest()
+
+                if entry is None or entry['hash'] != digest:
+                    entry = {'hash': digest, 'strings': self.parse_file(content)}
+                    num_parsed += 1
+
+                entry = {**entry, 'mtime': fstat.st_mtime_ns, 'size': fstat.st_size}
+
+            files[relpath] = entry
+            lang = sys.intern(lang_file.name[:-4])
+            if len(entry['strings']) > 0:
+                self.lib.setdefault(lang, {}).update(entry['strings'])
+
+        if settings.lang_bundle and (num_parsed > 0 or files != bundle):
+            self.save_bundle(files)
+
+        log.debug('Language files loaded: %i, parsed: %i', len(files), num_parsed)
+        self.compile()
+
+    @staticmethod
+    def parse_file(content):
+        """
+        Parses a language file, keeping only its string and number values. Keys and values are interned, since
+        many strings are repeated across languages.
+        :param content: The file content.
+        :return: A dict with the strings.
+        """
+        yml = YAML(typ='safe')
+        data = dict(yml.load(content.decode('utf8')))
+
+        strings = {}
+        for k, v in data.items():
+            if not isinstance(v, str) and not isinstance(v, int) and not isinstance(v, float):
+                continue
+
+            strings[sys.intern(k) if isinstance(k, str) else k] = sys.intern(str(v))
 
-                for k, v in data.items():
-                    if not isinstance(v, str) and not isinstance(v, int) and not isinstance(v, float):
-                        continue
+        return strings
 
-                    if lang not in self.lib:
-                        self.lib[lang] = {}
+    def load_bundle(self):
+        """
+        :return: The files stored on the bundle, or an empty dict if the bundle doesn't exist or is invalid.
+        """
+        try:
+            with self.bundle_path.open('rb') as f:
+                bundle = marshal.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            log.warning('Could not read the language bundle: %s', e)
+            return {}
 
-                    self.lib[lang][k] = str(v)
+        if not isinstance(bundle, dict) or bundle.get('version') != self.bundle_version:
+            return {}
+
+        # marshal keeps interned strings interned when loading them
+        return bundle['files']
+
+    def save_bundle(self, files):
+        """
+        Stores the parsed files on the bundle. The bundle is written to a temporary file first, so a
+        partially written bundle is never loaded.
+        :param files: The files dict.
+        """
+        tmp_path = self.bundle_path.with_suffix('.tmp')
+        try:
+            self.bundle_path.parent.mkdir(exist_ok=True)
+            with tmp_path.open('wb') as f:
+                marshal.dump({'version': self.bundle_version, 'files': files}, f)
+            os.replace(tmp_path, self.bundle_path)
+        except OSError as e:
+            log.warning('Could not store the language bundle: %s', e)
+
+    def compile(self):
+        """
+        Compiles the loaded strings into templates. Every language gets the default language's templates
+        for its missing or empty strings, so the fallback is resolved only once.
+        """
+        compiled = {
+            lang: {k: Template(v) for k, v in strings.items() if v.strip() != ''}
+            for lang, strings in self.lib.items()
+        }
+
+        default_templates = compiled.get(self.default, {})
+        self.templates = {}
+        for lang, templates in compiled.items():
+            self.templates[lang] = templates if lang == self.default else {**default_templates, **templates}
+
+        self.format_cache = {}
+        self._templates_default = self.default
 
     def get(self, name, __lang=None, **kwargs):
         if __lang is None:
             __lang = self.default
 
-        if __lang not in self.lib:
-            text = __lang + '_' + name
-        elif name not in self.lib[__lang] or self.lib[__lang][name].strip() == '':
+        if self._templates_default != self.default:
+            self.compile()
+
+        if __lang not in self.templates:
+            return __lang + '_' + name
+
+        template = self.templates[__lang].get(name)
+        if template is None:
             if __lang == self.default:
-                text = '[{}:{}]'.format(__lang, name)
+                return '[{}:{}]'.format(__lang, name)
             else:
-                text = self.get(name, self.default, **kwargs)
-        else:
-            text = self.lib[__lang][name]
-
-            try:
-                text = text.format(**kwargs)
-            except KeyError:
-                pass
+                return self.get(name, self.default, **kwargs)
 
-        return text
+        return template.render(kwargs)
 
     def get_list(self, name, separator='|', __lang=None, **kwargs):
         val = self.get(name, __lang, **kwargs)
@@ -71,6 +228,9 @@ class Language:
 
 
 class SingleLanguage:
+    # Maximum amount of messages formatted without locales to keep, per Language instance
+    max_cached = 2048
+
     def __init__(self, instance, lang):
         self.instance = instance
         self.lang = lang
@@ -81,28 +241,73 @@ class SingleLanguage:
     def get_list(self, name, separator='|', **kwargs):
         return self.instance.get_list(name, separator, self.lang, **kwargs)
 
-    def format(self, message, locales=None):
+    def format(self, message, locales=None, tokens=None):
+        """
+        Replaces the language placeholders ($[name]) of a message, and then its message tokens ($AU, $PX, etc).
+        Every text is visited once, and an embed's footer and fields are only updated if their text changed.
+        :param message: The message, a str or a discord.Embed instance. Other values are converted to str.
+        :param locales: The locales used to format the language strings.
+        :param tokens: A dict with the values of the message tokens, like {'$PX': '!'}. Tokens that are not
+        on the dict are left as they are.
+        :return: The formatted message. Embeds are modified in place.
+        """
         if isinstance(message, str):
-            locales = locales or {}
-            for m in pat_lang_placeholder.finditer(message):
-                message = message.replace(m.group(0), self.get(m.group(1), **locales))
+            if '$' not in message:
+                return message
+
+            if '$[' in message:
+                message = self._expand(message, locales) if locales else self._expand_cached(message)
+            if tokens and '$' in message:
+                message = pat_message_token.sub(lambda m: tokens.get(m.group(0), m.group(0)), message)
 
-            return self.format(message) if pat_lang_placeholder.search(message) else message
+            return message
         elif isinstance(message, Embed):
             if message.title is not None:
-                message.title = self.format(message.title, locales)
+                message.title = self.format(message.title, locales, tokens)
             if message.description is not None:
-                message.description = self.format(message.description, locales)
-            if message.footer.text is not None:
-                message.set_footer(text=self.format(message.footer.text, locales), icon_url=message.footer.icon_url)
+                message.description = self.format(message.description, locales, tokens)
+
+            footer_text = message.footer.text
+            if footer_text is not None:
+                new_text = self.format(footer_text, locales, tokens)
+                if new_text != footer_text:
+                    message.set_footer(text=new_text, icon_url=message.footer.icon_url)
 
             for idx, field in enumerate(message.fields):
-                message.set_field_at(idx,
-                                     name=self.format(field.name, locales),
-                                     value=self.format(field.value, locales),
-                                     inline=field.inline)
+                name = self.format(field.name, locales, tokens)
+                value = self.format(field.value, locales, tokens)
+                if name != field.name or value != field.value:
+                    message.set_field_at(idx, name=name, value=value, inline=field.inline)
             return message
         elif message is None:
             return None
         else:
-            return self.format(str(message), locales)
+            return self.format(str(message), locales, tokens)
+
+    def _expand(self, message, locales):
+        values = {}
+        for m in pat_lang_placeholder.finditer(message):
+            if m.group(0) not in values:
+                values[m.group(0)] = self.get(m.group(1), **locales)
+
+        if any('$' in v for v in values.values()):
+            # Replacements could create new placeholders, so they're replaced one by one, in order
+            for placeholder, value in values.items():
+                message = message.replace(placeholder, value)
+        else:
+            message = pat_lang_placeholder.sub(lambda m: values[m.group(0)], message)
+
+        return self.format(message) if '$[' in message and pat_lang_placeholder.search(message) else message
+
+    def _expand_cached(self, message):
+        # Messages without locales always expand to the same text, so they're cached
+        cache = self.instance.format_cache
+        key = (self.lang, message)
+        result = cache.get(key)
+        if result is None:
+            if len(cache) >= self.max_cached:
+                cache.clear()
+
+            result = cache[key] = self._expand(message, {})
+
+        return result
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+import peewee
+
+from bot.database import BotDatabase
+from bot.logger import new_logger
+
+log = new_logger('Migrations')
+
+
+class SchemaVersion(peewee.Model):
+    table = peewee.CharField(max_length=100, unique=True)
+    version = peewee.IntegerField(default=0)
+    updated = peewee.DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = BotDatabase().db
+        table_name = 'schema_version'
+
+
+def add_indexes(model):
+    """
+    Migration step that creates the indexes declared on a model, if they don't exist yet. On MySQL, the indexed
+    columns are changed to their declared types first (see `alter_indexed_columns`). Rows with duplicated values
+    are removed before creating the unique indexes, keeping the newest row.
+    """
+    if isinstance(model._meta.database, peewee.MySQLDatabase):
+        alter_indexed_columns(model)
+
+    for names in unique_indexes(model):
+        remove_duplicates(model, names)
+
+    model._schema.create_indexes(safe=True)
+
+
+def indexed_fields(model):
+    """
+    :return: The list of fields of a model that are part of an index, besides the primary key.
+    """
+    fields = {field.name: field for field in model._meta.sorted_fields
+              if (field.index or field.unique) and not field.primary_key}
+    for index in model._meta.indexes:
+        if isinstance(index, (tuple, list)):
+            for name in index[0]:
+                fields[name] = model._meta.fields[name]
+
+    return list(fields.values())
+
+
+def unique_indexes(model):
+    """
+    :return: A list with the field names of every unique index of a model, besides the primary key.
+    """
+    names = [(field.name,) for field in model._meta.sorted_fields if field.unique and not field.primary_key]
+    for index in model._meta.indexes:
+        if isinstance(index, (tuple, list)) and index[1]:
+            names.append(tuple(index[0]))
+
+    return names
+
+
+def alter_indexed_columns(model):
+    """
+    Changes the indexed text columns of a model to their declared VARCHAR types. Older tables have TEXT columns,
+    and MySQL can't index them without a key length.
+    """
+    db = model._meta.database
+    for field in indexed_fields(model):
+        if not isinstance(field, peewee.CharField):
+            continue
+
+        ctx = db.get_sql_context()
+        ctx.literal('ALTER TABLE ').sql(peewee.Entity(model._meta.table_name)).literal(' MODIFY ').sql(field.ddl(ctx))
+        db.execute_sql(*ctx.query())
+
+
+def remove_duplicates(model, names):
+    """
+    Removes the rows that have the same values on the given fields, keeping the newest (last inserted) row.
+    :param model: The peewee.Model class.
+    :param names: The field names.
+    :return: The amount of removed rows.
+    """
+    fields = [model._meta.fields[name] for name in names]
+    pk = model._meta.primary_key
+    groups = (model
+              .select(*fields, peewee.fn.MAX(pk))
+              .group_by(*fields)
+              .having(peewee.fn.COUNT(pk) > 1)
+              .tuples())
+
+    removed = 0
+    # The groups are read before deleting, as some databases can't delete from a table that is being read
+    for row in list(groups):
+        values, newest = row[:-1], row[-1]
+        where = [field == value for field, value in zip(fields, values)]
+        removed += model.delete().where(*where, pk != newest).execute()
+
+    if removed > 0:
+        log.info('Removed %i duplicated rows from table "%s"', removed, model._meta.table_name)
+    return removed
+
+
+def migrate(models):
+    """
+    Creates the tables for the given models, and updates the existing tables to the models' current schema version.
+    A model declares its migration steps as a list of functions on its `schema_migrations` attribute, which receive
+    the model class. The schema version of a table is the amount of steps applied to it. Every step is run on its own
+    transaction, and if a step fails, the next ones are not run for that table, so they're retried the next time.
+    Newly created tables are already up to date, so they're only marked with the current version.
+    :param models: The list of peewee.Model classes.
+    """
+    db = BotDatabase().db
+    db.create_tables([SchemaVersion], safe=True)
+
+    for model in models:
+        table = model._meta.table_name
+        steps = getattr(model, 'schema_migrations', [])
+        existed = model.table_exists()
+        # Existing tables get their indexes from the migration steps
+        if not existed:
+            model.create_table()
+
+        row, _ = SchemaVersion.get_or_create(table=table)
+        if not existed:
+            if row.version != len(steps):
+                row.version = len(steps)
+                row.updated = datetime.now()
+                row.save()
+            continue
+
+        for version in range(row.version, len(steps)):
+            step = steps[version]
+            log.info('Migrating table "%s" to version %i (%s)', table, version + 1, step.__name__)
+            try:
+                with db.atomic():
+                    step(model)
+                    row.version = version + 1
+                    row.updated = datetime.now()
+                    row.save()
+            except peewee.DatabaseError as e:
+                log.error('Could not migrate table "%s" to version %i', table, version + 1)
+                log.exception(e)
+                break
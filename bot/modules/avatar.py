@@ -3,7 +3,7 @@ from bot.utils import img_embed
 
 
 class Avatar(Command):
-    __version__ = '1.0.0'
+    __version__ = '1.1.0'
     __author__ = 'makzk'
 
     def __init__(self, bot):
@@ -22,3 +22,12 @@ class Avatar(Command):
         text = '$[user-avatar]' if bool(user.display_avatar.url) else '$[user-avatar-no]'
         embed = img_embed(str(user.display_avatar.url), text, '[$[avatar-ext-link]]({})'.format(ext_url))
         await cmd.answer(embed=embed, locales={'user': user.display_name})
+
+    async def on_user_update(self, before, after):
+        # Drop the resized copies of replaced avatars
+        if before.display_avatar.key != after.display_avatar.key:
+            self.bot.avatars.invalidate(before.display_avatar.key)
+
+    async def on_member_update(self, before, after):
+        if before.display_avatar.key != after.display_avatar.key:
+            self.bot.avatars.invalidate(before.display_avatar.key)
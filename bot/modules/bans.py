@@ -4,19 +4,47 @@ from discord import Embed
 from datetime import datetime
 
 from bot import Command, BotDatabase, categories, settings
+from bot.migrations import add_indexes
 from bot.utils import is_int
 from bot.regex import pat_usertag, pat_snowflake
 
 
 class Ban(peewee.Model):
     user = peewee.TextField()
-    userid = peewee.TextField(default="")
+    userid = peewee.CharField(max_length=32, default="")
     bans = peewee.BigIntegerField(default=0)
-    server = peewee.TextField()
+    server = peewee.CharField(max_length=32)
     lastban = peewee.DateTimeField(null=True)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
+        indexes = ((('userid', 'server'), True),)
+
+
+def store_bans(key, delta, data):
+    """
+    Stores the accumulated bans of a user. Used by the ban counter buffer.
+    """
+    userid, server = key
+    update = Ban.update(bans=Ban.bans + delta, lastban=data['lastban'], user=data['user'])
+    if update.where(Ban.userid == userid, Ban.server == server).execute() == 0:
+        Ban.create(userid=userid, server=server, user=data['user'], bans=delta, lastban=data['lastban'])
+
+
+ban_counter = BotDatabase().counter('bans', store_bans)
+
+
+def get_bans(member):
+    """
+    Retrieves the amount of bans of a member, including the pending ones.
+    :param member: The discord.Member.
+    :return: A tuple with the amount of bans and if the member has been banned before.
+    """
+    userban = Ban.get_or_none(Ban.userid == member.id, Ban.server == member.guild.id)
+    pending = ban_counter.get((str(member.id), str(member.guild.id)))
+    stored = 0 if userban is None else userban.bans
+    return stored + pending, userban is not None or pending > 0
 
 
 class BanCmd(Command):
@@ -78,19 +106,16 @@ class BanCmd(Command):
                              locales={'author': cmd.author.display_name, 'other': mention_name})
             return
 
-        user, created = Ban.get_or_create(userid=member.id, server=cmd.message.guild.id,
-                                          defaults={'user': str(member)})
-        update = Ban.update(bans=Ban.bans + 1, lastban=datetime.now(), user=str(member))
-        update = update.where(Ban.userid == member.id, Ban.server == cmd.message.guild.id)
-        update.execute()
+        amount, banned_before = await self.bot.db.run(get_bans, member)
+        ban_counter.add((str(member.id), str(cmd.message.guild.id)), user=str(member), lastban=datetime.now())
 
-        if created:
+        if not banned_before:
             await cmd.answer('$[ban-first-one]', withname=False,
                              locales={'author': cmd.author.display_name, 'other': mention_name})
         else:
             await cmd.answer('$[ban-success]', withname=False,
                              locales={
-                                 'author': cmd.author.display_name, 'other': mention_name, 'amount': user.bans + 1
+                                 'author': cmd.author.display_name, 'other': mention_name, 'amount': amount + 1
                              })
 
 
@@ -117,16 +142,15 @@ class Bans(Command):
             await cmd.answer('$[bans-owner-error]')
             return
 
-        userbans, created = Ban.get_or_create(userid=member.id, server=cmd.message.guild.id,
-                                              defaults={'user': str(member)})
+        amount, _ = await self.bot.db.run(get_bans, member)
 
         locales = None
-        if userbans.bans == 0:
+        if amount == 0:
             mesg = "```\nException in thread \"main\" cl.discord.alexis.ZeroBansException\n"
             mesg += "    at AlexisBot.main(AlexisBot.java:34)\n```"
         else:
-            word = cmd.lng('bans-singular') if userbans.bans == 1 else cmd.lng('bans-plural')
-            locales = {'amount': userbans.bans, 'ban': word}
+            word = cmd.lng('bans-singular') if amount == 1 else cmd.lng('bans-plural')
+            locales = {'amount': amount, 'ban': word}
 
             if member.id == cmd.author.id:
                 mesg = '$[bans-self]'
@@ -159,11 +183,8 @@ class SetBans(Command):
             return
 
         num_bans = int(cmd.args[-1])
-        user, _ = Ban.get_or_create(userid=member.id, server=cmd.message.guild.id,
-                                    defaults={'user': str(member)})
-        update = Ban.update(bans=num_bans, lastban=datetime.now(), user=str(member))
-        update = update.where(Ban.userid == member.id, Ban.server == cmd.message.guild.id)
-        update.execute()
+        ban_counter.discard((str(member.id), str(cmd.message.guild.id)))
+        await self.bot.db.run(self.set_bans, member, num_bans)
 
         name = member.display_name
         if num_bans == 0:
@@ -172,6 +193,12 @@ class SetBans(Command):
             word = cmd.lng('bans-singular') if num_bans == 1 else cmd.lng('bans-plural')
             await cmd.answer('$[setbans-info]', locales={'other': name, 'amount': num_bans, 'ban': word})
 
+    @staticmethod
+    def set_bans(member, num_bans):
+        Ban.get_or_create(userid=member.id, server=member.guild.id, defaults={'user': str(member)})
+        update = Ban.update(bans=num_bans, lastban=datetime.now(), user=str(member))
+        update.where(Ban.userid == member.id, Ban.server == member.guild.id).execute()
+
 
 class BanRank(Command):
     def __init__(self, bot):
@@ -184,22 +211,45 @@ class BanRank(Command):
         self.category = categories.FUN
 
     async def handle(self, cmd):
-        bans = Ban.select().where(Ban.server == cmd.message.channel.guild.id).order_by(Ban.bans.desc())
         px = settings.command_prefix
-        banlist = []
         limit = 10 if cmd.cmdname == '{}{}'.format(px, self.name) else 5
+        ranking = await self.bot.db.run(self.get_ranking, str(cmd.message.channel.guild.id), limit)
 
-        i = 1
-        for item in bans.iterator():
-            u = cmd.get_member(item.userid) or item.user
-            banlist.append('{}. {}: {}'.format(i, u, item.bans))
-
-            i += 1
-            if i > limit:
-                break
+        banlist = []
+        for i, (userid, user, bans) in enumerate(ranking, 1):
+            u = cmd.get_member(userid) or user
+            banlist.append('{}. {}: {}'.format(i, u, bans))
 
         if len(banlist) == 0:
             await cmd.answer('$[banrank-empty]')
         else:
             embed = Embed(title='$[banrank-title]', description='\n'.join(banlist))
             await cmd.answer(embed)
+
+    @staticmethod
+    def get_ranking(guild_id, limit):
+        """
+        Retrieves the users with the most bans on a guild, merging the pending bans.
+        :param guild_id: The guild ID.
+        :param limit: The amount of users to retrieve.
+        :return: A list of (user ID, user name, bans) tuples.
+        """
+        pending = {userid: (delta, data) for (userid, server), (delta, data) in ban_counter.pending().items()
+                   if server == guild_id}
+
+        # Users with pending bans can move up to the ranking, so they're retrieved apart from the top ones
+        query = Ban.select(Ban.userid, Ban.user, Ban.bans).where(Ban.server == guild_id)
+        rows = {userid: [user, bans] for userid, user, bans in
+                query.order_by(Ban.bans.desc()).limit(limit).tuples()}
+        missing = [userid for userid in pending if userid not in rows]
+        if len(missing) > 0:
+            rows.update({userid: [user, bans] for userid, user, bans in
+                         query.where(Ban.userid << missing).tuples()})
+
+        for userid, (delta, data) in pending.items():
+            row = rows.setdefault(userid, [data['user'], 0])
+            row[0] = data['user']
+            row[1] += delta
+
+        ranking = sorted(rows.items(), key=lambda r: r[1][1], reverse=True)[:limit]
+        return [(userid, user, bans) for userid, (user, bans) in ranking]
@@ -2,7 +2,7 @@ import traceback
 
 from discord import Colour
 
-from bot import Command, CommandEvent, BotMentionEvent, MessageEvent, GuildConfiguration, settings
+from bot import Command, CommandEvent, BotMentionEvent, MessageEvent, settings
 from bot.common import is_bot_owner, is_owner, is_pm
 
 
@@ -10,6 +10,11 @@ class CommandHandler(Command):
     __author__ = 'makzk'
     __version__ = '1.0.1'
 
+    def __init__(self, bot):
+        super().__init__(bot)
+        # Commands can take a long time, so they're not cancelled
+        self.handler_timeout = 0
+
     async def on_message(self, message):
         if CommandEvent.is_command(message, self.bot):
             event = CommandEvent(message, self.bot)
@@ -39,23 +44,23 @@ class StartsWithHandler(Command):
     __author__ = 'makzk'
     __version__ = '1.0.0'
 
+    def __init__(self, bot):
+        super().__init__(bot)
+        # Commands can take a long time, so they're not cancelled
+        self.handler_timeout = 0
+
     async def on_message(self, message):
         try:
-            mgr_swhandlers = self.bot.swhandlers
             swhandlers = []
-            config = GuildConfiguration.get_instance(message.guild)
-            for swtext in mgr_swhandlers.keys():
-                swtextrep = swtext.replace('$PX', config.prefix)
-                if message.content.startswith(swtextrep):
-                    swhandler = mgr_swhandlers[swtext]
-                    if (swhandler.bot_owner_only and not is_bot_owner(message.author, self.bot))\
-                            or swhandler.owner_only and not is_owner(self.bot, message)\
-                            or not swhandler.allow_pm and is_pm(message):
-                        continue
-
-                    swhandlers.append(swhandler)
-                    if swhandler.swhandler_break:
-                        break
+            for swhandler in self.bot.router.match(message).swhandlers:
+                if (swhandler.bot_owner_only and not is_bot_owner(message.author, self.bot))\
+                        or swhandler.owner_only and not is_owner(self.bot, message)\
+                        or not swhandler.allow_pm and is_pm(message):
+                    continue
+
+                swhandlers.append(swhandler)
+                if swhandler.swhandler_break:
+                    break
 
             if len(swhandlers) > 0:
                 event = MessageEvent(message, self.bot)
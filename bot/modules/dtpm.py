@@ -161,7 +161,9 @@ class DTPM(Command):
         }
         self.log.debug('Loading %s', url)
 
-        await self.http.get(url)
+        # The response of this request is not used, so it's released right away
+        r = await self.http.get(url)
+        r.release()
         
         async with self.http.post(url, data=body_data, headers=header_data) as r:
             text = await r.text()
@@ -78,8 +78,8 @@ class InviteFilter(Command):
             return
 
         config = GuildConfiguration.get_instance(message.guild)
-        filter_enabled = config.get(self.cfg_filter_status, '0') == '1'
-        if not filter_enabled or message.author.id in config.get_list(self.cfg_filter_list):
+        filter_enabled = config.get_bool(self.cfg_filter_status, False)
+        if not filter_enabled or str(message.author.id) in config.get_set(self.cfg_filter_list):
             return
 
         invite = pat_invite.search(message.content)
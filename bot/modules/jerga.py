@@ -16,6 +16,7 @@ class Jerga(Command):
         self.aliases = ['dc']
         self.help = '$[jerga-help]'
         self.category = categories.INFORMATION
+        self.http_cache_ttl = 86400
 
     async def handle(self, cmd):
         text = cmd.text if cmd.text != '' else 'weon'
@@ -25,30 +26,30 @@ class Jerga(Command):
             self.log.debug('Loading %s...', (baseurl + text_url))
 
             await cmd.typing()
-            async with self.http.get(baseurl + text_url) as r:
-                content = await r.text()
-                soup = BeautifulSoup(content, 'html.parser')
-                div_definition = soup.find_all('div', class_='definition')
-                if len(div_definition) == 0:
-                    await cmd.answer('$[jerga-not-found]')
-                    return
-
-                resultados = []
-                for i in range(len(div_definition)):
-                    pgraph = div_definition[i].find_all('p')
-                    definition = pgraph[0].text.strip()
-                    example = pgraph[1].text.strip()
-                    resultados.append('**{}.- {}**\n*\"{}\"*'.format(i+1, definition, example))
-
-                embed = Embed()
-                embed.title = text
-                embed.url = baseurl + text_url
-                embed.description = '\n\n'.join(resultados)
-                embed.set_footer(text='$[jerga-footer]')
-
-                await cmd.answer(embed=embed, locales={
-                    'site': 'Diccionario Chileno - https://www.diccionariochileno.cl/'
-                })
+            r = await self.fetch(baseurl + text_url)
+            content = r.text()
+            soup = BeautifulSoup(content, 'html.parser')
+            div_definition = soup.find_all('div', class_='definition')
+            if len(div_definition) == 0:
+                await cmd.answer('$[jerga-not-found]')
+                return
+
+            resultados = []
+            for i in range(len(div_definition)):
+                pgraph = div_definition[i].find_all('p')
+                definition = pgraph[0].text.strip()
+                example = pgraph[1].text.strip()
+                resultados.append('**{}.- {}**\n*\"{}\"*'.format(i+1, definition, example))
+
+            embed = Embed()
+            embed.title = text
+            embed.url = baseurl + text_url
+            embed.description = '\n\n'.join(resultados)
+            embed.set_footer(text='$[jerga-footer]')
+
+            await cmd.answer(embed=embed, locales={
+                'site': 'Diccionario Chileno - https://www.diccionariochileno.cl/'
+            })
         except Exception as e:
             self.log.error(e)
             raise e
@@ -1,24 +1,106 @@
 import discord
 
-from bot import Command, CommandEvent, GuildConfiguration, settings
-from bot.utils import replace_everywhere
+from bot import Command, CommandEvent, GuildConfiguration, SingleLanguage, settings
+from bot.cache import LRUCache
+from bot.language import pat_message_token
 
 
 class LangFilter(Command):
+    # Maximum amount of users with their direct messages language kept
+    max_cached_users = 10000
+
     def __init__(self, bot):
         super().__init__(bot)
         self.priority = 10
-        self.autolang_cache = {}
         self.name = 'resetlangs'
         self.help = '$[config-resetlangs-help]'
         self.bot_owner_only = True
 
+        # Languages of the guilds shared with each user, as {user ID: {language: guilds count}}. Users are added
+        # when their language is first needed, and then their counts are kept up to date.
+        self.user_langs = LRUCache(self.max_cached_users)
+        # Languages of the guilds counted on the users' languages, by guild ID
+        self.guild_langs = {}
+
     async def handle(self, cmd):
-        self.autolang_cache = {}
+        self.user_langs.clear()
+        self.guild_langs = {}
         await cmd.answer('$[config-resetlangs-done]')
 
+    async def on_guild_join(self, guild):
+        lang = self.get_guild_lang(guild)
+        for member in guild.members:
+            self.add_user_lang(member.id, lang)
+
+    async def on_guild_remove(self, guild):
+        lang = self.guild_langs.pop(guild.id, None)
+        if lang is None:
+            return
+
+        for member in guild.members:
+            self.remove_user_lang(member.id, lang)
+
+    async def on_member_join(self, member):
+        self.add_user_lang(member.id, self.get_guild_lang(member.guild))
+
+    async def on_member_remove(self, member):
+        self.remove_user_lang(member.id, self.get_guild_lang(member.guild))
+
+    async def on_guild_lang_update(self, guild, lang):
+        prev_lang = self.guild_langs.get(guild.id)
+        if prev_lang is None or prev_lang == lang:
+            return
+
+        self.guild_langs[guild.id] = lang
+        for member in guild.members:
+            self.remove_user_lang(member.id, prev_lang)
+            self.add_user_lang(member.id, lang)
+
+    def get_guild_lang(self, guild):
+        if guild.id not in self.guild_langs:
+            self.guild_langs[guild.id] = GuildConfiguration.get_instance(guild).get('lang', settings.default_language)
+        return self.guild_langs[guild.id]
+
+    def add_user_lang(self, user_id, lang):
+        # Users that are not indexed yet are counted when they're first needed
+        langs = self.user_langs.get(user_id)
+        if langs is not None:
+            langs[lang] = langs.get(lang, 0) + 1
+
+    def remove_user_lang(self, user_id, lang):
+        langs = self.user_langs.get(user_id)
+        if langs is None or lang not in langs:
+            return
+
+        if langs[lang] > 1:
+            langs[lang] -= 1
+        else:
+            del langs[lang]
+
+    def get_user_lang(self, user):
+        """
+        Determines the language for a user, as the most used language on the guilds shared with the bot.
+        :param user: The discord.User.
+        :return: The language code, or None if the user does not share any guild with the bot.
+        """
+        langs = self.user_langs.get(user.id)
+        if langs is None:
+            langs = {}
+            for guild in self.bot.guilds:
+                if guild.get_member(user.id) is not None:
+                    lang = self.get_guild_lang(guild)
+                    langs[lang] = langs.get(lang, 0) + 1
+            self.user_langs.set(user.id, langs)
+
+        return max(langs, key=langs.get) if len(langs) > 0 else None
+
     def pre_send_message(self, kwargs):
         lang = self.auto_lang(kwargs)
+        locales = kwargs.get('locales', None)
+        evt = kwargs.get('event')
+        prefix = GuildConfiguration.get_instance(getattr(evt, 'guild', None)).prefix
+        tokens = self.get_tokens(evt, prefix)
+
         if 'content' in kwargs:
             if kwargs['content'] is None:
                 kwargs['content'] = ''
@@ -27,35 +109,34 @@ class LangFilter(Command):
                 kwargs['content'] = str(kwargs['content'])
 
             if kwargs['content'] != '':
-                kwargs['content'] = lang.format(kwargs['content'], kwargs.get('locales', None))
+                kwargs['content'] = lang.format(kwargs['content'], locales, tokens).lstrip(prefix)
 
         if kwargs.get('embed', None) is not None:
-            kwargs['embed'] = lang.format(kwargs['embed'], kwargs.get('locales', None))
-
-        if kwargs.get('event', None):
-            kwargs['content'] = kwargs['content'].replace('$AU', kwargs['event'].author_name)
-            kwargs['content'] = kwargs['content'].replace('$CMD', '$PX$NM')
-
-            if kwargs.get('embed', None) is not None:
-                replace_everywhere(kwargs['embed'], '$CMD', '$PX$NM')
-                replace_everywhere(kwargs['embed'], '$AU', kwargs['event'].author_name)
-
-            if isinstance(kwargs['event'], CommandEvent):
-                kwargs['content'] = kwargs['content'].replace('$NM', kwargs['event'].cmdname)
+            kwargs['embed'] = lang.format(kwargs['embed'], locales, tokens)
 
-                if kwargs.get('embed', None) is not None:
-                    replace_everywhere(kwargs['embed'], '$NM', kwargs['event'].cmdname)
-
-        evt = kwargs.get('event')
-        guild = getattr(evt, 'guild', None)
-        prefix = GuildConfiguration.get_instance(guild).prefix
+    @staticmethod
+    def get_tokens(evt, prefix):
+        """
+        Determines the values of the message tokens. $PX is the command prefix, and when the message is
+        related to an event, $AU is the event's author name, $NM the command name and $CMD the prefix
+        with the command name.
+        :param evt: The event that triggered the message, if any.
+        :param prefix: The command prefix.
+        :return: A dict with the tokens values.
+        """
+        tokens = {'$PX': prefix}
+        if not evt:
+            return tokens
 
-        if 'content' in kwargs and kwargs['content']:
-            kwargs['content'] = kwargs['content'].replace('$PX', prefix)
-            kwargs['content'] = kwargs['content'].lstrip(prefix)
+        if isinstance(evt, CommandEvent):
+            tokens['$NM'] = evt.cmdname.replace('$PX', prefix)
+            tokens['$CMD'] = prefix + tokens['$NM']
+        else:
+            tokens['$CMD'] = prefix + '$NM'
 
-        if kwargs.get('embed', None) is not None:
-            replace_everywhere(kwargs['embed'], '$PX', prefix)
+        # The author name is replaced first, so the other tokens are replaced on it too
+        tokens['$AU'] = pat_message_token.sub(lambda m: tokens.get(m.group(0), m.group(0)), evt.author_name)
+        return tokens
 
     def auto_lang(self, kwargs):
         """
@@ -69,43 +150,30 @@ class LangFilter(Command):
 
         destination = kwargs.get('destination')
 
-        # If the destination is a discord.Channel or a discord.Member
-        # (or any other destination instance that has the 'server' attribute)
-        if hasattr(destination, 'guild'):
-            return self.get_lang(destination.guild, destination)
-
-        # If the destination is a user
-        elif isinstance(destination, discord.channel.DMChannel) \
-                or isinstance(destination, discord.channel.GroupChannel):
+        # If the destination is a user. DM channels have a guild attribute too (always None), so they're
+        # checked first.
+        if isinstance(destination, (discord.User, discord.channel.DMChannel, discord.channel.GroupChannel)):
             # The event could've been triggered from a guild, so use its language
-            if hasattr(kwargs, 'event') and not kwargs['event'].is_pm:
-                return self.get_lang(kwargs['event'].guild, kwargs['event'].channel)
+            event = kwargs.get('event')
+            if event is not None and not event.is_pm:
+                return self.get_lang(event.guild, event.channel)
 
-            if isinstance(destination, discord.channel.GroupChannel):
+            if isinstance(destination, discord.User):
+                user = destination
+            elif isinstance(destination, discord.channel.GroupChannel):
                 user = destination.owner
             else:
                 user = destination.recipient
 
-            if user.id in self.autolang_cache:
-                return self.get_lang(self.autolang_cache[user.id])
-
-            # Fetch common guilds between the user and the bot, and get the guilds languages.
-            langs = [
-                self.bot.sv_config.get(sv.id, 'lang', settings.default_language)
-                for sv in self.bot.servers if sv.get_member(user.id) is not None
-            ]
-
             # If there are no common guilds, just use the default language
             # (but it's kinda rare to talk to a bot that you don't have any guild in common, right?)
-            if len(langs) == 0:
-                return self.get_lang()
-
-            # Get the mode language from the common user-bot guilds and use it.
-            mode_lang = max(set(langs), key=langs.count)
-            self.autolang_cache[user.id] = mode_lang
-            self.log.debug('Language automatically set to %s for user "%s"', mode_lang, str(user))
+            lang = None if user is None else self.get_user_lang(user)
+            return SingleLanguage(self.bot.lang, lang or settings.default_language)
 
-            return self.get_lang(mode_lang)
+        # If the destination is a discord.TextChannel or a discord.Member
+        # (or any other destination instance with a guild)
+        elif getattr(destination, 'guild', None) is not None:
+            return self.get_lang(destination.guild, destination)
 
         # Return the default language
         else:
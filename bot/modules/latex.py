@@ -1,7 +1,10 @@
+import asyncio
+import hashlib
 from io import BytesIO
-from PIL import Image, ImageOps
 
-from bot import Command, categories
+from bot import Command, categories, imaging, settings
+from bot.cache import DiskCache
+from bot.workers import WorkersBusyError
 from discord import File
 
 api_url = 'https://www.quicklatex.com/latex3.f'
@@ -9,7 +12,7 @@ api_url = 'https://www.quicklatex.com/latex3.f'
 
 class LaTeX(Command):
     __author__ = 'makzk'
-    __version__ = '0.0.1'
+    __version__ = '0.1.0'
 
     def __init__(self, bot):
         super().__init__(bot)
@@ -17,34 +20,65 @@ class LaTeX(Command):
         self.aliases = ['tex']
         self.category = categories.UTILITY
 
+        # Rendered formulas, by formula hash
+        self.cache = DiskCache(settings.base_dir / 'cache' / 'latex', settings.latex_cache_disk * 1024 * 1024,
+                               suffix='.png')
+
     async def handle(self, cmd):
         if cmd.text == '':
             return await cmd.answer('$[latex-format]')
 
         formula = cmd.text.replace(' ', '')
+        key = hashlib.sha256(formula.encode('utf-8')).hexdigest()
+        image = await asyncio.to_thread(self.cache.get, key)
+
+        if image is None:
+            await cmd.typing()
+            try:
+                # Concurrent requests for the same formula share the same render
+                image = await self.bot.web.flights.run(('latex', key), self.render, key, formula)
+            except RenderError as e:
+                return await cmd.answer(e.message, locales=e.locales)
+            except WorkersBusyError:
+                return await cmd.answer('$[workers-busy]')
+
+        return await cmd.answer(file=File(BytesIO(image), filename='formula.png'))
+
+    async def render(self, key, formula):
+        """
+        Renders a formula with QuickLaTeX, adds a border to the picture and stores it on the cache.
+        :param key: The formula cache key.
+        :param formula: The formula.
+        :return: The PNG encoded picture.
+        :raises RenderError: If the formula could not be rendered.
+        """
         params = {
             'fsize': '24px', 'fcolor': '000000', 'mode': 0, 'out': 1, 'bcolor': 'ffffff',
             'formula': '\\begin{align*}\n%s\n\\end{align*}' % formula
         }
 
-        await cmd.typing()
         async with self.http.post(api_url, data=params) as r:
             if r.status != 200:
-                return await cmd.answer('$[latex-error-status] ({})'.format(r.status))
+                raise RenderError('$[latex-error-status] ({})'.format(r.status))
 
             result = (await r.text()).split('\n')
             if len(result) > 2:
-                return await cmd.answer('$[latex-error-server]', locales={'error': result[2]})
+                raise RenderError('$[latex-error-server]', {'error': result[2]})
+
+        result_url = result[1].split(' ')[0]
+        async with self.http.get(result_url) as image_r:
+            if image_r.status != 200:
+                raise RenderError('$[latex-error-image]')
+
+            image_data = await image_r.read()
 
-            result_url = result[1].split(' ')[0]
-            async with self.http.get(result_url) as image_r:
-                if image_r.status != 200:
-                    return await cmd.answer('$[latex-error-image]')
+        image = await self.run_worker(imaging.add_border, image_data, 10, 'white')
+        await asyncio.to_thread(self.cache.set, key, image)
+        return image
 
-                image_border_data = BytesIO()
-                image_data = Image.open(BytesIO(await image_r.read()))
-                image_border = ImageOps.expand(image_data, border=10, fill='white')
-                image_border.save(image_border_data, format='PNG')
-                image_border_data = BytesIO(image_border_data.getvalue())
 
-                return await cmd.answer(file=File(image_border_data, filename='formula.png'))
+class RenderError(Exception):
+    def __init__(self, message, locales=None):
+        super().__init__(message)
+        self.message = message
+        self.locales = locales
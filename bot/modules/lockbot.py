@@ -53,7 +53,7 @@ class LockBot(Command):
             return
 
         config = GuildConfiguration.get_instance(message.guild)
-        lockedlist = config.get_list(cfg_locked)
+        lockedlist = config.get_set(cfg_locked)
         if cfg_all in lockedlist or str(message.channel.id) in lockedlist:
             return False
 
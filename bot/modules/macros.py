@@ -5,23 +5,37 @@ import peewee
 from discord import Embed, Colour
 
 from bot import Command, BotDatabase, categories, settings
+from bot.migrations import add_indexes
 from bot.utils import is_int, get_colour, format_date, colour_list
 
 pat_macro_name = re.compile(r'^[\w\-.,$%&¿?¡!+]{3,50}')
 
 
 class EmbedMacro(peewee.Model):
-    name = peewee.TextField()
-    server = peewee.TextField()
+    name = peewee.CharField(max_length=100)
+    server = peewee.CharField(max_length=32)
     image_url = peewee.TextField(null=True)
     title = peewee.TextField(null=True)
     description = peewee.TextField(null=True)
     embed_color = peewee.IntegerField(default=Colour.default().value)
     created = peewee.DateTimeField(default=datetime.now)
     used_count = peewee.IntegerField(default=0, null=False)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
+        indexes = ((('server', 'name'), True),)
+
+
+def store_uses(key, delta, data):
+    """
+    Stores the accumulated uses of a macro. Used by the macro uses counter buffer.
+    """
+    EmbedMacro.update(used_count=EmbedMacro.used_count + delta).where(EmbedMacro.id == key).execute()
+
+
+uses_counter = BotDatabase().counter('macro_uses', store_uses)
+
 
 class MacroSet(Command):
     db_models = [EmbedMacro]
@@ -290,9 +304,9 @@ class MacroUse(Command):
         # Use an embed macro, if it exists
         try:
             guild_id = 'global' if cmd.is_pm else cmd.message.guild.id
-            macro = EmbedMacro.get(EmbedMacro.name == macro_name, EmbedMacro.server << [guild_id, 'global'])
-            macro.used_count += 1
-            macro.save()
+            macro = await self.bot.db.run(
+                EmbedMacro.get, EmbedMacro.name == macro_name, EmbedMacro.server << [guild_id, 'global'])
+            uses_counter.add(macro.id, server=macro.server)
 
             if macro.image_url is None and macro.title is None:
                 await cmd.answer(safe_format(macro.description, macro_args))
@@ -361,9 +375,8 @@ class MacroRank(Command):
         self.category = categories.UTILITY
 
     async def handle(self, cmd):
-        sortage = 'asc' if cmd.argc == 1 and cmd.args[0] in ['inv', 'inverse'] else 'desc'
-        result = EmbedMacro.select().where(EmbedMacro.server == cmd.guild.id).order_by(
-            getattr(EmbedMacro.used_count, sortage)()).limit(10)
+        inverse = cmd.argc == 1 and cmd.args[0] in ['inv', 'inverse']
+        result = await self.bot.db.run(self.get_ranking, str(cmd.guild.id), inverse, 10)
 
         if len(result) == 0:
             await cmd.answer('$[macros-none-found]')
@@ -374,6 +387,34 @@ class MacroRank(Command):
 
         await cmd.answer('```{}```'.format('\n'.join(result)))
 
+    @staticmethod
+    def get_ranking(guild_id, inverse, limit):
+        """
+        Retrieves the most (or least) used macros of a guild, merging the pending uses.
+        :param guild_id: The guild ID.
+        :param inverse: Sort the macros from the least used.
+        :param limit: The amount of macros to retrieve.
+        :return: A list of EmbedMacro instances.
+        """
+        pending = {key: delta for key, (delta, data) in uses_counter.pending().items() if data['server'] == guild_id}
+        query = EmbedMacro.select().where(EmbedMacro.server == guild_id)
+
+        if inverse:
+            # Pending uses can only move macros down, so the extra rows cover the ones that are displaced
+            macros = {m.id: m for m in query.order_by(EmbedMacro.used_count.asc()).limit(limit + len(pending))}
+        else:
+            # Macros with pending uses can move up to the ranking, so they're retrieved apart from the top ones
+            macros = {m.id: m for m in query.order_by(EmbedMacro.used_count.desc()).limit(limit)}
+            missing = [key for key in pending if key not in macros]
+            if len(missing) > 0:
+                macros.update({m.id: m for m in query.where(EmbedMacro.id << missing)})
+
+        for key, delta in pending.items():
+            if key in macros:
+                macros[key].used_count += delta
+
+        return sorted(macros.values(), key=lambda m: m.used_count, reverse=not inverse)[:limit]
+
 
 def safe_format(strp, args):
     """
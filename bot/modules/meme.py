@@ -1,17 +1,17 @@
 from io import BytesIO
-from PIL import Image, ImageFont, ImageDraw
+from PIL import ImageFont
 from discord import File
 
-from bot import Command, categories
+from bot import Command, categories, imaging
 from bot.regex import pat_usertag
-from bot.utils import download
+from bot.workers import WorkersBusyError
 
 furl = 'https://github.com/sophilabs/macgifer/raw/master/static/font/impact.ttf'
 
 
 class Meme(Command):
     __author__ = 'makzk'
-    __version__ = '1.0.3'
+    __version__ = '1.1.0'
 
     def __init__(self, bot):
         super().__init__(bot)
@@ -21,30 +21,34 @@ class Meme(Command):
         self.format = '$[format]:```$[memes-format-1]\n$[memes-format-2]\n$[memes-format-3]\n' \
                       '$[memes-format-4]\n$[memes-format-5]```'
         self.isize = 512
+        # Path of the font file, only set when it's valid
         self.mpath = None
-        self.font = None
-        self.font_smaller = None
 
     async def on_ready(self):
-        self.mpath = await download('impact.ttf', furl)
-        if self.mpath is None:
+        mpath = await self.bot.assets.get('impact.ttf', furl)
+        if mpath is None:
             self.log.warn('Could not retrieve the font')
             return
 
+        # The font is loaded by the workers, so it's only checked here
         try:
-            self.font = ImageFont.truetype(self.mpath, size=int(self.isize/8))
-            self.font_smaller = ImageFont.truetype(self.mpath, size=int(self.isize/14))
+            ImageFont.truetype(mpath, size=int(self.isize/8))
         except OSError as e:
             if str(e) == 'unknown file format':
                 self.log.warn('The cached or downloaded font is invalid. '
-                              'Try deleting "cache/impact.ttf" and running the bot again.')
+                              'Try deleting "cache/assets/impact.ttf" and running the bot again.')
+            else:
+                self.log.warn('Could not load the font: %s', e)
+            return
+
+        self.mpath = mpath
 
     async def handle(self, cmd):
         if cmd.argc == 0:
             await cmd.answer(self.format)
             return
 
-        if self.font is None:
+        if self.mpath is None:
             await cmd.answer('$[memes-disabled]')
             return
 
@@ -59,63 +63,12 @@ class Meme(Command):
         lower = args[0] if len(args) == 1 else args[1]
 
         await cmd.typing()
-        self.log.debug('Downloading user avatar: %s', str(user.display_avatar.url))
-        avatar_data = await user.display_avatar.read()
-
-        avatar_data = Image.open(BytesIO(avatar_data)).resize((self.isize, self.isize), Image.LANCZOS)
-        im = Image.new('RGBA', (self.isize, self.isize))
-        im.paste(avatar_data, (0, 0))
-
-        self.meme_draw(im, lower, upper=False)
-        if upper:
-            self.meme_draw(im, upper)
-
-        temp = BytesIO()
-        im.save(temp, format='PNG')
-        temp = BytesIO(temp.getvalue())  # eliminar bytes nulos
+        try:
+            avatar_data = await self.bot.avatars.get_asset(user.display_avatar, self.isize)
+            data = await self.run_worker(imaging.meme, avatar_data, self.mpath, self.isize, lower, upper)
+        except WorkersBusyError:
+            await cmd.answer('$[workers-busy]')
+            return
 
         self.log.debug('Meme generated!')
-        await cmd.channel.send(cmd.author_name, file=File(temp, filename='meme.png'))
-
-    def meme_draw(self, im, text, upper=True):
-        draw = ImageDraw.Draw(im)
-        sep = int(self.isize / 23)
-
-        use_smaller = len(self.text_splitter(draw, text, self.isize - sep)) > 2
-        draw.font = self.font_smaller if use_smaller else self.font
-
-        # Determine text position
-        text = '\n'.join(self.text_splitter(draw, text, self.isize - sep))
-        height = draw.multiline_textbbox((0,0), text)[3]
-        width = draw.textlength(text)
-
-        xy = (int(self.isize/2)) - int(width/2), (15 if upper else self.isize - sep - height)
-
-        # Draw shadow
-        i = 2
-        x, y = xy
-        draw.multiline_text((x+i, y+i), text, align='center', fill='black')
-        draw.multiline_text((x+i, y-i), text, align='center', fill='black')
-        draw.multiline_text((x-i, y-i), text, align='center', fill='black')
-        draw.multiline_text((x-i, y+i), text, align='center', fill='black')
-
-        # Draw text itself
-        draw.multiline_text(xy, text, align='center')
-
-    def text_splitter(self, draw: ImageDraw, text: str, max_width: int, font=None):
-        lines = []
-        words = [f.strip() for f in text.split(' ')]
-
-        line = []
-        for word in words:
-            width = draw.multiline_textbbox((0, 0), ' '.join(line) + word)[2]
-            if width > max_width and len(line) > 0:
-                lines.append(' '.join(line))
-                line = [word]
-            else:
-                line.append(word)
-
-        if len(line) > 0:
-            lines.append(' '.join(line))
-
-        return lines
+        await cmd.channel.send(cmd.author_name, file=File(BytesIO(data), filename='meme.png'))
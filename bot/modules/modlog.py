@@ -1,9 +1,13 @@
+import time
+from datetime import timedelta
+
 import discord
 from discord.utils import escape_markdown, utcnow
 
 from bot import Command, utils, categories
 from discord import Embed, AuditLogAction
 
+from bot.cache import SingleFlight
 from bot.regex import pat_channel
 from bot.utils import deltatime_to_str
 
@@ -12,9 +16,26 @@ modlog_types = ['user_join', 'user_leave', 'message_delete', 'username', 'nick',
 
 class ModLog(Command):
     __author__ = 'makzk'
-    __version__ = '1.1.0'
+    __version__ = '1.2.0'
     chan_config_name = 'join_send_channel'
 
+    # Amount of the latest audit log entries kept per guild, and time in seconds they're used before fetching
+    # them again. Only entries up to alog_max_age seconds old are used to attribute actions, as Discord
+    # groups repeated message deletions on a single entry for a few minutes.
+    alog_batch = 25
+    alog_ttl = 2
+    alog_max_age = 300
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        # Cached entries by guild ID, as (fetch start time, entries) tuples
+        self.alogs = {}
+        # Amount of events attributed to every entry, by guild ID and entry ID
+        self.alog_uses = {}
+        # Last time the entries were fetched again because of a lookup without results, by guild ID
+        self.alog_refetched = {}
+        self.alog_flights = SingleFlight()
+
     async def on_member_join(self, member):
         from bot.modules.user import UserInfo
 
@@ -75,11 +96,12 @@ class ModLog(Command):
                 msg = '$[modlog-bot-deleted-msg]'
         else:
             try:
-                last = await self.get_last_alog(message.guild)
-                if last is not None and last.action == AuditLogAction.message_delete and \
-                        last.extra.channel.id == message.channel.id and last.target.id == message.author.id:
+                last = await self.find_alog(
+                    message.guild, AuditLogAction.message_delete,
+                    lambda e: e.extra.channel.id == message.channel.id and e.target.id == message.author.id)
+                if last is not None:
                     who = last.user
-                    if who == self.bot.user.id:
+                    if who.id == self.bot.user.id:
                         msg = '$[modlog-bot-deleted-msg]'
                     else:
                         locales['deleter_name'] = who.display_name
@@ -149,15 +171,10 @@ class ModLog(Command):
                     locales={'prev_name': name_before, 'new_name': name_after}, logtype='username')
 
         if (before.nick or after.nick) and before.nick != after.nick:
-            try:
-                alog = await self.get_last_alog(after.guild)
-            except discord.Forbidden:
-                alog = None
-
-            if alog is not None and alog.action == AuditLogAction.member_update and alog.changes.after.nick:
-                by = alog.user
-            else:
-                by = None
+            alog = await self.find_alog(
+                after.guild, AuditLogAction.member_update,
+                lambda e: e.target.id == after.id and hasattr(e.changes.after, 'nick'))
+            by = None if alog is None else alog.user
 
             prev_nick = escape_markdown(before.nick or '') or '$[modlog-nick-none]'
             after_nick = escape_markdown(after.nick or '') or '$[modlog-nick-none]'
@@ -182,19 +199,91 @@ class ModLog(Command):
                 else:
                     await self.bot.send_modlog(guild, '$[modlog-nick-by]', logtype='nick', locales=locales)
 
-    async def get_last_alog(self, guild: discord.Guild):
+    async def find_alog(self, guild: discord.Guild, action, check=None):
+        """
+        Finds the newest recent audit log entry of a guild for an action, that was not already used to attribute
+        all the events it represents. The found entry is marked as used once.
+        :param guild: The guild.
+        :param action: The discord.AuditLogAction to find.
+        :param check: A function that receives an entry and returns if it's the wanted one.
+        :return: The discord.AuditLogEntry instance, or None if it was not found or the audit log could not
+        be retrieved.
+        """
+        since = time.monotonic()
         try:
-            entries = [entry async for entry in guild.audit_logs(limit=1)]
-        except discord.Forbidden:
+            entry = self.match_alog(guild, await self.get_alogs(guild), action, check)
+
+            # Entries fetched before the event can't include its entry, so they're fetched again. Many events don't
+            # have an entry (e.g. users deleting their own messages), so this is done once per alog_ttl seconds.
+            cached = self.alogs.get(guild.id)
+            if entry is None and cached is not None and cached[0] < since \
+                    and since - self.alog_refetched.get(guild.id, 0) >= self.alog_ttl:
+                self.alog_refetched[guild.id] = since
+                entry = self.match_alog(guild, await self.get_alogs(guild, refresh=True), action, check)
+        except discord.HTTPException as e:
+            self.log.warning('Could not retrieve the audit log of the guild %s: %s', guild.id, e)
             return None
+
+        if entry is not None:
+            uses = self.alog_uses.setdefault(guild.id, {})
+            uses[entry.id] = uses.get(entry.id, 0) + 1
+
+        return entry
+
+    def match_alog(self, guild, entries, action, check):
+        uses = self.alog_uses.get(guild.id, {})
+        min_date = utcnow() - timedelta(seconds=self.alog_max_age)
+        for entry in entries:
+            if entry.created_at < min_date:
+                break
+            if entry.action != action or uses.get(entry.id, 0) >= self.alog_count(entry):
+                continue
+            if check is None or check(entry):
+                return entry
+
+        return None
+
+    @staticmethod
+    def alog_count(entry):
+        # Repeated message deletions are grouped on a single entry, with the amount of deleted messages
+        return getattr(entry.extra, 'count', None) or 1
+
+    async def get_alogs(self, guild: discord.Guild, refresh=False):
+        """
+        Retrieves the latest audit log entries of a guild, from the newest to the oldest. Entries are kept for a
+        short time, and concurrent lookups for the same guild share the same request.
+        :param guild: The guild.
+        :param refresh: If True, the kept entries are not used.
+        :return: The list of discord.AuditLogEntry instances.
+        """
+        cached = self.alogs.get(guild.id)
+        if not refresh and cached is not None and time.monotonic() - cached[0] < self.alog_ttl:
+            return cached[1]
+
+        return await self.alog_flights.run(guild.id, self.load_alogs, guild)
+
+    async def load_alogs(self, guild: discord.Guild):
+        start = time.monotonic()
+        try:
+            entries = [entry async for entry in guild.audit_logs(limit=self.alog_batch)]
+        except discord.Forbidden:
+            entries = []
         except AttributeError:
             self.log.warning('There was probably an unknown (for discord.py) Audit Log action and triggered this error')
-            return None
+            entries = self.alogs.get(guild.id, (0, []))[1]
 
-        if len(entries) == 0:
-            return None
+        self.alogs[guild.id] = (start, entries)
+
+        # Only the uses of the entries that can still be matched are kept
+        ids = {entry.id for entry in entries}
+        uses = self.alog_uses.get(guild.id, {})
+        self.alog_uses[guild.id] = {entry_id: n for entry_id, n in uses.items() if entry_id in ids}
+        return entries
 
-        return entries[0]
+    async def on_guild_remove(self, guild):
+        self.alogs.pop(guild.id, None)
+        self.alog_uses.pop(guild.id, None)
+        self.alog_refetched.pop(guild.id, None)
 
 
 class ModLogChannel(Command):
@@ -24,26 +24,26 @@ class NekosLife(Command):
         url = base_url + 'endpoints'
         self.log.info('Loading nekos.life endpoints from %s ...', url)
 
-        async with self.http.get(url) as r:
-            data = await r.json()
-            if not isinstance(data, list):
-                self.log.warn('Invalid data received for nekos.life endpoints')
-                return
-
-            # Look for image endpoints
-            for ep in data:
-                if '/api/v2/img/' in ep:
-                    self.img_types = [
-                        t[2:-1] for t in ep.split('<')[1][:-1].split(',')
-                        if t[2:-1] not in ['v3', 'nekoapi_v3.1']
-                    ]
-                    break
-
-            # Check if types were retrieved
-            if len(self.img_types) == 0:
-                self.log.warn('No image types were retrieved')
-            else:
-                self.log.info('%i image types were found', len(self.img_types))
+        r = await self.fetch(url, ttl=86400)
+        data = r.json()
+        if not isinstance(data, list):
+            self.log.warn('Invalid data received for nekos.life endpoints')
+            return
+
+        # Look for image endpoints
+        for ep in data:
+            if '/api/v2/img/' in ep:
+                self.img_types = [
+                    t[2:-1] for t in ep.split('<')[1][:-1].split(',')
+                    if t[2:-1] not in ['v3', 'nekoapi_v3.1']
+                ]
+                break
+
+        # Check if types were retrieved
+        if len(self.img_types) == 0:
+            self.log.warn('No image types were retrieved')
+        else:
+            self.log.info('%i image types were found', len(self.img_types))
 
     async def handle(self, cmd):
         # no subcmd or help
@@ -82,6 +82,7 @@ class OwOify(Command):
         self.name = 'owoify'
         self.help = '$[nekos-owoify-help]'
         self.format = '$[nekos-owoify-format]'
+        self.http_cache_ttl = 3600
 
     async def handle(self, cmd):
         # filter text and check its length
@@ -93,12 +94,12 @@ class OwOify(Command):
         # get converted text from api
         url = base_url + 'owoify?' + urlencode({'text': text})
         await cmd.typing()
-        async with self.http.get(url) as r:
-            data = await r.json()
-
-            if 'msg' in data:
-                await cmd.answer('$[nekos-owoify-error]', locales={'error_msg': data['msg']})
-            elif 'owo' in data:
-                await cmd.answer(data['owo'], withname=True)
-            else:
-                await cmd.answer('$[nekos-invalid-response]')
+        r = await self.fetch(url)
+        data = r.json()
+
+        if 'msg' in data:
+            await cmd.answer('$[nekos-owoify-error]', locales={'error_msg': data['msg']})
+        elif 'owo' in data:
+            await cmd.answer(data['owo'], withname=True)
+        else:
+            await cmd.answer('$[nekos-invalid-response]')
@@ -14,6 +14,7 @@ class Nyaa(Command):
         self.help = '$[nyaa-help]'
         self.format = '$[nyaa-format]'
         self.default_enabled = False
+        self.http_cache_ttl = 300
 
     async def handle(self, cmd):
         if cmd.argc == 0:
@@ -28,24 +29,24 @@ class Nyaa(Command):
         url = 'https://nyaa.si/?page=rss&c=0_0&f=0&' + urlencode({'q': query})
         self.log.debug('Loading %s ...', url)
         await cmd.typing()
-        async with self.http.get(url) as r:
-            p = feedparser.parse(await r.text())
-
-            if len(p.entries) == 0:
-                await cmd.answer('$[nyaa-no-results]')
-                return
-
-            embed = Embed(title='$[nyaa-title]')
-            for entry in p.entries[:10]:
-                details = '[[info]({link})] [[torrent]({torrent})] - S: {seeders} - L: {leechers} - {date}'
-                details = details.format(
-                    seeders=entry.nyaa_seeders,
-                    leechers=entry.nyaa_leechers,
-                    link=entry.guid,
-                    torrent=entry.link,
-                    date=entry.published
-                )
-
-                embed.add_field(name=entry.title, value=details)
-
-            await cmd.answer(embed)
+        r = await self.fetch(url)
+        p = feedparser.parse(r.text())
+
+        if len(p.entries) == 0:
+            await cmd.answer('$[nyaa-no-results]')
+            return
+
+        embed = Embed(title='$[nyaa-title]')
+        for entry in p.entries[:10]:
+            details = '[[info]({link})] [[torrent]({torrent})] - S: {seeders} - L: {leechers} - {date}'
+            details = details.format(
+                seeders=entry.nyaa_seeders,
+                leechers=entry.nyaa_leechers,
+                link=entry.guid,
+                torrent=entry.link,
+                date=entry.published
+            )
+
+            embed.add_field(name=entry.title, value=details)
+
+        await cmd.answer(embed)
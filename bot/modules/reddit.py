@@ -1,27 +1,56 @@
+import asyncio
 import html
+import time
 
 import discord
 import peewee
 from discord import Embed
 
 from bot import Command, BotDatabase, categories
+from bot.migrations import add_indexes
 from bot.utils import text_cut, auto_int
 from bot.regex import pat_channel, pat_subreddit
 
 
+def lowercase_subreddits(model):
+    """
+    Migration step that stores the subreddit names in lowercase, keeping only the newest row of every subreddit.
+    """
+    # The rows are read before changing them, as the changes could affect an open cursor
+    rows = list(model.select().order_by(model.timestamp.desc(), model.id.desc()))
+    newest = set()
+    removed = []
+    with model._meta.database.atomic():
+        for row in rows:
+            sub = row.subreddit.lower()
+            if sub in newest:
+                removed.append(row.id)
+                continue
+
+            newest.add(sub)
+            if row.subreddit != sub:
+                model.update(subreddit=sub).where(model.id == row.id).execute()
+
+        if len(removed) > 0:
+            model.delete().where(model.id.in_(removed)).execute()
+
+
 class RedditLastPost(peewee.Model):
     post_id = peewee.CharField()
-    subreddit = peewee.CharField()
+    # Stored in lowercase, as reddit returns the names with their own case
+    subreddit = peewee.CharField(index=True)
     timestamp = peewee.IntegerField(default=0)
+    schema_migrations = [add_indexes, lowercase_subreddits]
 
     class Meta:
         database = BotDatabase().db
 
 
 class ChannelFollow(peewee.Model):
-    subreddit = peewee.TextField()
+    subreddit = peewee.CharField(index=True)
     serverid = peewee.TextField()
     channelid = peewee.TextField()
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
@@ -29,9 +58,16 @@ class ChannelFollow(peewee.Model):
 
 class RedditFollow(Command):
     __author__ = 'makzk'
-    __version__ = '1.2.2'
+    __version__ = '1.3.0'
     db_models = [RedditLastPost, ChannelFollow]
 
+    # Subreddits requested on a single multi-subreddit listing
+    group_size = 20
+    # Maximum amount of new posts sent per subreddit on every poll
+    max_posts = 10
+    # Maximum time in seconds to wait after reddit rate limits the requests
+    max_backoff = 900
+
     def __init__(self, bot):
         super().__init__(bot)
         self.name = 'reddit'
@@ -44,8 +80,21 @@ class RedditFollow(Command):
         self.category = categories.STAFF
         self.schedule = (self.load_task, 15)
 
+        # Last seen post by subreddit (lowercase name), as (post ID, creation timestamp) tuples
+        self.last_posts = {}
+        self.changed_subs = set()
+        # Validators (ETag and Last-Modified) of the last listing retrieved for every group URL
+        self.validators = {}
+        self.backoff = 0
+        self.backoff_until = 0
+
     def on_loaded(self):
         self.load_channels()
+        self.last_posts = {
+            sub: (post_id, timestamp)
+            for sub, post_id, timestamp in RedditLastPost.select(
+                RedditLastPost.subreddit, RedditLastPost.post_id, RedditLastPost.timestamp).tuples()
+        }
 
     async def handle(self, cmd):
         if cmd.argc < 1:
@@ -90,7 +139,7 @@ class RedditFollow(Command):
                     if chan.subreddit not in self.chans:
                         self.chans[chan.subreddit] = []
 
-                    self.chans[chan.subreddit].append(chan.channelid)
+                    self.chans[chan.subreddit].append(str(chan.channelid))
                     return
                 else:
                     await cmd.answer('$[reddit-error-sub-already-added]')
@@ -103,10 +152,8 @@ class RedditFollow(Command):
                     asd.delete_instance()
 
                     if cmd.args[1] in self.chans:
-                        for tup in self.chans[cmd.args[1]]:
-                            if tup == (cmd.message.guild.id, channel.id):
-                                self.chans[cmd.args[1]].remove(tup)
-                                break
+                        if str(channel.id) in self.chans[cmd.args[1]]:
+                            self.chans[cmd.args[1]].remove(str(channel.id))
                         if len(self.chans[cmd.args[1]]) == 0:
                             del self.chans[cmd.args[1]]
 
@@ -129,51 +176,151 @@ class RedditFollow(Command):
             await cmd.answer('$[format]: $[reddit-format]')
 
     async def load_task(self):
-        for (subname, subchannels) in self.chans.items():
-            post = await self.get_last_post(subname)
-            if not post:
-                self.log.warning('Error fetching post from r/%s', subname)
-                continue
+        if len(self.chans) == 0 or time.monotonic() < self.backoff_until:
+            return
 
-            ins, updated = RedditLastPost.get_or_create(subreddit=subname, defaults={
-                'post_id': post['id'], 'timestamp': post['created']})
+        # Subscriptions by lowercase subreddit name, as reddit returns the names with their own case
+        subs = {}
+        for subname, subchannels in self.chans.items():
+            subs.setdefault(subname.lower(), []).append((subname, subchannels))
 
-            if not updated and ins.post_id != post['id'] and ins.timestamp < post['created']:
-                ins.post_id = post['id']
-                ins.timestamp = post['created']
-                ins.save()
-                updated = True
+        names = sorted(subs.keys())
+        groups = [names[i:i + self.group_size] for i in range(0, len(names), self.group_size)]
+        results = await asyncio.gather(*[self.get_group_posts(group) for group in groups])
 
-            if updated:
+        sends = {}
+        for posts in results:
+            for sub, post in self.new_posts(posts):
                 embed = self.post_to_embed(post)
+                if embed is None:
+                    continue
+
+                for subname, subchannels in subs.get(sub, []):
+                    for channel in subchannels:
+                        sends.setdefault(channel, []).append((subname, embed))
+
+        # Posts are sent to all the channels at once, but in order on each channel
+        await asyncio.gather(*[self.send_posts(channel, posts) for channel, posts in sends.items()])
+        await self.save_last_posts()
+
+    async def get_group_posts(self, subs):
+        """
+        Retrieves the newest posts of a group of subreddits with a single multi-subreddit listing request.
+        The listing is requested conditionally, so it's not transferred again if it didn't change. If reddit
+        rate limits the request, the polling is paused for an increasing time.
+        :param subs: The list of subreddit names.
+        :return: The list of posts data, or an empty list if the listing could not be retrieved or didn't change.
+        """
+        url = 'https://www.reddit.com/r/{}/new.json?limit=100'.format('+'.join(subs))
+        etag, last_modified = self.validators.get(url, (None, None))
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+
+        try:
+            async with self.http.get(url, headers=headers) as r:
+                if r.status == 429:
+                    self.backoff = min(max(self.backoff * 2, 30), self.max_backoff)
+                    retry_after = auto_int(r.headers.get('Retry-After', '0'))
+                    wait = max(self.backoff, retry_after if isinstance(retry_after, int) else 0)
+                    self.backoff_until = time.monotonic() + wait
+                    self.log.warning('Rate limited by reddit, waiting %i seconds', wait)
+                    return []
+
+                if r.status == 304:
+                    self.backoff = 0
+                    return []
+
+                if r.status != 200:
+                    self.log.warning('Error fetching posts from r/%s (status %i)', '+'.join(subs), r.status)
+                    return []
+
+                self.backoff = 0
+                self.validators[url] = (r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+                data = await r.json()
+                return [post['data'] for post in data['data']['children']]
+        except Exception as e:
+            self.log.warning('Error fetching posts from r/%s: %s', '+'.join(subs), e)
+            return []
+
+    def new_posts(self, posts):
+        """
+        Filters the posts that are newer than the last seen posts of their subreddits, and updates them.
+        Only the newest post is used for subreddits without a last seen post.
+        :param posts: The list of posts data.
+        :return: A list of (subreddit, post) tuples, from the oldest to the newest post.
+        """
+        by_sub = {}
+        for post in posts:
+            by_sub.setdefault(post['subreddit'].lower(), []).append(post)
+
+        result = []
+        for sub, sub_posts in by_sub.items():
+            sub_posts.sort(key=lambda p: p['created'])
+            last = self.last_posts.get(sub)
+            if last is None:
+                new = sub_posts[-1:]
+            else:
+                last_id, last_timestamp = last
+                new = [p for p in sub_posts if p['created'] > last_timestamp and p['id'] != last_id]
 
-                for channel in subchannels:
-                    chan = self.bot.get_channel(auto_int(channel))
-                    if chan is not None:
-                        try:
-                            await self.bot.send_message(chan, content='$[reddit-message-title]', embed=embed,
-                                                        locales={'sub': subname})
-                        except discord.Forbidden:
-                            self.log.debug('Could not sent a r/%s post to %s (%s) #%s (%s) due to missing permissions',
-                                           subname, chan.guild.name, chan.guild.id, chan.name, chan.id)
-                    else:
-                        self.log.warning('Channel ID %s not found for subreddit subscription r/%s, removing',
-                                         channel, subname)
-                        to_del = ChannelFollow.get_or_none(
-                            ChannelFollow.subreddit == subname, ChannelFollow.channelid == channel)
-                        if to_del is not None:
-                            to_del.delete_instance()
-                            self.chans[subname].remove(channel)
-
-    async def get_last_post(self, sub):
-        url = 'https://www.reddit.com/r/{}/new.json?limit=1'.format(sub)
-        async with self.http.get(url) as r:
-            if not r.status == 200:
-                return None
-
-            data = await r.json()
-            posts = data['data']['children']
-            return posts[0]['data'] if len(posts) > 0 else None
+            if len(new) == 0:
+                continue
+
+            self.last_posts[sub] = (new[-1]['id'], new[-1]['created'])
+            self.changed_subs.add(sub)
+            result += [(sub, post) for post in new[-self.max_posts:]]
+
+        return result
+
+    async def send_posts(self, channel, posts):
+        chan = self.bot.get_channel(auto_int(channel))
+        if chan is None:
+            for subname, _ in posts:
+                if channel in self.chans.get(subname, []):
+                    self.log.warning('Channel ID %s not found for subreddit subscription r/%s, removing',
+                                     channel, subname)
+                    self.chans[subname].remove(channel)
+                    query = ChannelFollow.delete().where(
+                        ChannelFollow.subreddit == subname, ChannelFollow.channelid == channel)
+                    await self.bot.db.run(query.execute)
+            return
+
+        for subname, embed in posts:
+            try:
+                await self.bot.send_message(chan, content='$[reddit-message-title]', embed=embed,
+                                            locales={'sub': subname})
+            except discord.Forbidden:
+                self.log.debug('Could not sent a r/%s post to %s (%s) #%s (%s) due to missing permissions',
+                               subname, chan.guild.name, chan.guild.id, chan.name, chan.id)
+                return
+
+    async def save_last_posts(self):
+        """
+        Stores the last seen posts that changed, in a single transaction.
+        """
+        if len(self.changed_subs) == 0:
+            return
+
+        changed = {sub: self.last_posts[sub] for sub in self.changed_subs}
+        self.changed_subs = set()
+
+        def save():
+            with BotDatabase().db.atomic():
+                for sub, (post_id, timestamp) in changed.items():
+                    query = RedditLastPost.update(post_id=post_id, timestamp=timestamp)
+                    if query.where(RedditLastPost.subreddit == sub).execute() == 0:
+                        RedditLastPost.create(subreddit=sub, post_id=post_id, timestamp=timestamp)
+
+        try:
+            await self.bot.db.run(save)
+        except Exception as e:
+            self.changed_subs.update(changed.keys())
+            self.log.error('Could not store the last seen posts')
+            self.log.exception(e)
 
     def load_channels(self):
         self.chans = {}
@@ -182,21 +329,7 @@ class RedditFollow(Command):
             if chan.subreddit not in self.chans:
                 self.chans[chan.subreddit] = []
 
-            self.chans[chan.subreddit].append(chan.channelid)
-
-    async def get_posts(self, sub, since=0):
-        url = 'https://www.reddit.com/r/{}/new.json'.format(sub)
-        async with self.http.get(url) as r:
-            if not r.status == 200:
-                return []
-
-            posts = []
-            data = await r.json()
-            for post in data['data']['children']:
-                if since < post['data']['created']:
-                    posts.append(post['data'])
-
-            return posts
+            self.chans[chan.subreddit].append(str(chan.channelid))
 
     @staticmethod
     def post_to_embed(post):
@@ -1,9 +1,12 @@
+import asyncio
+import heapq
 from datetime import datetime
 
 import peewee
 from discord import Embed
 
 from bot import Command, BotDatabase, categories, settings
+from bot.migrations import add_indexes
 from bot.utils import timediff_parse, no_tags, deltatime_to_str, format_date, auto_int
 from bot.regex import pat_delta
 
@@ -14,29 +17,48 @@ class RemindMeEvent(peewee.Model):
     description = peewee.TextField()
     alerttime = peewee.DateTimeField()
     sent = peewee.BooleanField(default=False)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
+        indexes = ((('sent', 'alerttime'), False),)
 
 
 class RemindMe(Command):
     __author__ = 'makzk'
-    __version__ = '1.0.2'
+    __version__ = '1.1.0'
     db_models = [RemindMeEvent]
 
+    # Maximum amount of reminders delivered at the same time
+    max_concurrent_sends = 10
+    # Maximum amount of IDs on every batched update query
+    update_batch_size = 500
+    # Maximum time in seconds to sleep without checking the clock, in case the system time changes
+    max_sleep = 3600
+    # Time in seconds to wait before trying again to load the pending reminders, if they could not be loaded
+    load_retry = 30
+
     def __init__(self, bot):
         super().__init__(bot)
         self.name = 'remindme'
         self.help = '$[remindme-help]'
         self.usage = '$[remindme-usage]'
         self.category = categories.UTILITY
-        self.schedule = (self.remind_task, 5)
+        self.schedule = (self.remind_task, 0)
         self.default_config = {
             'remindme_text_limit': 150
         }
 
+        # Pending reminders, as a heap of (alert timestamp, ID) tuples, and their data by ID. Cancelled
+        # reminders are only removed from the data dict, and skipped when they're popped from the heap.
+        self.heap = []
+        self.reminders = {}
+        self.sent_ids = []
+        self.wakeup = asyncio.Event()
+
     async def handle(self, evt):
-        last = RemindMeEvent.get_or_none((RemindMeEvent.userid == evt.author.id) & (RemindMeEvent.sent == False))
+        last = await self.bot.db.run(
+            RemindMeEvent.get_or_none, (RemindMeEvent.userid == evt.author.id) & (RemindMeEvent.sent == False))
 
         if evt.argc < 2:
             if evt.argc == 0:
@@ -50,7 +72,8 @@ class RemindMe(Command):
                         await evt.answer('$[remindme-no-active]')
                     else:
                         last.sent = True
-                        last.save()
+                        await self.bot.db.run(last.save)
+                        self.reminders.pop(last.id, None)
                         await evt.answer('$[remindme-cancelled]')
                 else:
                     await evt.answer('$[format]: $[remindme-usage]')
@@ -78,23 +101,131 @@ class RemindMe(Command):
             return
 
         time = datetime.now() + dt
-        RemindMeEvent.create(userid=evt.author.id, description=text, alerttime=time)
+        event = await self.bot.db.run(RemindMeEvent.create, userid=evt.author.id, description=text, alerttime=time)
+        self.add_reminder(event.id, event.userid, event.description, event.alerttime, event.created)
 
         await evt.answer('$[remindme-success]', locales={
             'delta': deltatime_to_str(dt), 'datetime': format_date(time)
         })
 
     async def remind_task(self):
-        query = RemindMeEvent.select().where(
-            (RemindMeEvent.alerttime <= datetime.now()) &
-            (RemindMeEvent.sent == False)
-        )
-        for event in query:
-            user = self.bot.get_user(auto_int(event.userid))
-            if user is not None:
-                emb = Embed(title='RemindMe!', description=event.description)
-                emb.set_footer(text='$[remindme-footer]')
-                await self.bot.send_message(user, embed=emb, locales={'date': format_date(event.created)})
-
-            event.sent = True
-            event.save()
+        """
+        Loads the pending reminders once, and then delivers them as they're due, sleeping until the next
+        reminder's alert time, or until a new reminder is added. If the reminders could not be loaded, they're
+        loaded again after a while.
+        """
+        loaded = False
+        while True:
+            if not loaded:
+                loaded = await self.load_reminders()
+
+            try:
+                await self.send_due()
+                await self.flush_sent()
+            except Exception as e:
+                self.log.error('Could not send the due reminders')
+                self.log.exception(e)
+
+            self.wakeup.clear()
+            timeout = self.max_sleep
+            if len(self.heap) > 0:
+                timeout = min(max(self.heap[0][0] - datetime.now().timestamp(), 0), self.max_sleep)
+            if not loaded:
+                timeout = min(timeout, self.load_retry)
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def load_reminders(self):
+        """
+        Loads the pending reminders from the database into the heap.
+        :return: True if the reminders were loaded.
+        """
+        query = RemindMeEvent.select(
+            RemindMeEvent.id, RemindMeEvent.userid, RemindMeEvent.description,
+            RemindMeEvent.alerttime, RemindMeEvent.created
+        ).where(RemindMeEvent.sent == False).tuples()
+
+        try:
+            rows = await self.bot.db.run(list, query)
+        except Exception as e:
+            self.log.error('Could not load the pending reminders, trying again in %i seconds', self.load_retry)
+            self.log.exception(e)
+            return False
+
+        for row in rows:
+            self.add_reminder(*row, push=False)
+        heapq.heapify(self.heap)
+        self.log.debug('Loaded %i pending reminders', len(self.reminders))
+        return True
+
+    def add_reminder(self, event_id, userid, description, alerttime, created, push=True):
+        """
+        Adds a pending reminder to the heap.
+        :param event_id: The RemindMeEvent ID.
+        :param userid: The ID of the user to remind.
+        :param description: The reminder text.
+        :param alerttime: The datetime when the user must be reminded.
+        :param created: The datetime when the reminder was created.
+        :param push: If the reminder should be pushed into the heap. If it's False, the heap must be heapified later.
+        """
+        self.reminders[event_id] = (userid, description, created)
+        item = (alerttime.timestamp(), event_id)
+        if push:
+            heapq.heappush(self.heap, item)
+            self.wakeup.set()
+        else:
+            self.heap.append(item)
+
+    async def send_due(self):
+        now = datetime.now().timestamp()
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            _, event_id = heapq.heappop(self.heap)
+            reminder = self.reminders.pop(event_id, None)
+            if reminder is not None:
+                due.append((event_id, reminder))
+
+        if len(due) == 0:
+            return
+
+        sem = asyncio.Semaphore(self.max_concurrent_sends)
+
+        async def send(event_id, userid, description, created):
+            async with sem:
+                try:
+                    user = self.bot.get_user(auto_int(userid))
+                    if user is not None:
+                        emb = Embed(title='RemindMe!', description=description)
+                        emb.set_footer(text='$[remindme-footer]')
+                        await self.bot.send_message(user, embed=emb, locales={'date': format_date(created)})
+                except Exception as e:
+                    self.log.debug('Could not deliver the reminder %s to the user %s: %s', event_id, userid, e)
+                finally:
+                    self.sent_ids.append(event_id)
+
+        await asyncio.gather(*[send(event_id, *reminder) for event_id, reminder in due])
+
+    async def flush_sent(self):
+        """
+        Marks the delivered reminders as sent, with batched update queries. If the update fails, the IDs are kept
+        to be marked on the next run.
+        """
+        if len(self.sent_ids) == 0:
+            return
+
+        ids, self.sent_ids = self.sent_ids, []
+        size = self.update_batch_size
+
+        def update():
+            with BotDatabase().db.atomic():
+                for i in range(0, len(ids), size):
+                    RemindMeEvent.update(sent=True).where(RemindMeEvent.id.in_(ids[i:i + size])).execute()
+
+        try:
+            await self.bot.db.run(update)
+        except Exception:
+            self.sent_ids = ids + self.sent_ids
+            raise
@@ -69,8 +69,10 @@ class SetLanguage(Command):
 
                 cmd.config.unset('lang')
                 self.log.debug('Set default language for guild %s', cmd.guild)
+                await self.bot.dispatch_event('on_guild_lang_update', guild=cmd.guild, lang=settings.default_language)
                 await cmd.answer(self.bot.lang.get('lang-unset', None, lang=settings.default_language))
             else:
                 cmd.config.set('lang', cmd.text)
                 self.log.debug('Lang updated to %s for guild %s', cmd.config.get('lang'), cmd.guild)
+                await self.bot.dispatch_event('on_guild_lang_update', guild=cmd.guild, lang=cmd.text)
                 await cmd.answer(self.bot.lang.get('lang-set-to', lang, lang=cmd.text))
@@ -1,9 +1,10 @@
+import asyncio
 from io import BytesIO
-from PIL import Image
 from discord import File
 
-from bot import Command, CommandEvent, categories
-from bot.utils import parse_tag, download
+from bot import Command, CommandEvent, categories, imaging
+from bot.utils import parse_tag
+from bot.workers import WorkersBusyError
 
 heart_url = 'https://i.imgur.com/80c3IKZ.png'
 
@@ -19,7 +20,7 @@ class ShipperUwU(Command):
         self.heart_path = None
 
     async def on_ready(self):
-        self.heart_path = await download('heart.png', heart_url)
+        self.heart_path = await self.bot.assets.get('heart.png', heart_url)
         if self.heart_path is None:
             self.log.warning('Could not retrieve the heart picture')
             return
@@ -40,8 +41,8 @@ class ShipperUwU(Command):
             await cmd.answer('$[format]: $[ship-format]')
             return
 
-        item1_name, item1_url = item1
-        item2_name, item2_url = item2
+        item1_name, item1_key, item1_url = item1
+        item2_name, item2_key, item2_url = item2
 
         # Check if users are not the same
         if item1_url == item2_url:
@@ -51,46 +52,33 @@ class ShipperUwU(Command):
         await cmd.typing()
         self.log.debug('Generating picture...')
 
-        # Download profile pictures
-        self.log.debug('Downloading user1 avatar - %s', item1_url)
-        async with self.http.get(item1_url) as resp:
-            user1_avatar = await resp.read()
-        self.log.debug('Downloading user2 avatar - %s', item2_url)
-        async with self.http.get(item2_url) as resp:
-            user2_avatar = await resp.read()
-
-        # Open and resize pictures
-        user1_img = Image.open(BytesIO(user1_avatar)).resize((512, 512), Image.LANCZOS)
-        user2_img = Image.open(BytesIO(user2_avatar)).resize((512, 512), Image.LANCZOS)
-
-        # Open the heart <3
-        heart_img = Image.open(self.heart_path)
-
-        # Create picture
-        result = Image.new('RGBA', (1536, 512))
-        result.paste(user1_img, (0, 0))
-        result.paste(heart_img, (512, 0))
-        result.paste(user2_img, (1024, 0))
-
-        # Save picture in memory
-        temp = BytesIO()
-        result.save(temp, format='PNG')
-        temp = BytesIO(temp.getvalue())  # eliminar bytes nulos
+        # Retrieve the resized pictures and create the picture on a worker process
+        try:
+            user1_avatar, user2_avatar = await asyncio.gather(
+                self.bot.avatars.get(item1_key, item1_url), self.bot.avatars.get(item2_key, item2_url))
+            data = await self.run_worker(imaging.ship, user1_avatar, user2_avatar, self.heart_path)
+        except WorkersBusyError:
+            await cmd.answer('$[workers-busy]')
+            return
         self.log.debug('Image ready!')
 
         # Create ship name and send picture
         ship_name = item1_name[0:int(len(item1_name) / 2)] + item2_name[int(len(item2_name) / 2):]
         msg = cmd.lang.format('$[ship-msg]', locales={'ship_name': ship_name})
-        await cmd.channel.send(msg, file=File(temp, filename='ship.png'))
+        await cmd.channel.send(msg, file=File(BytesIO(data), filename='ship.png'))
 
 
 async def get_details(cmd: CommandEvent, text: str):
     item = parse_tag(text)
     if item is None or item['type'] == 'user':
         user = cmd.get_member(text) if item is None else cmd.get_member(item['id'])
-        return None if user is None else (user.display_name, str(user.display_avatar.url))
+        if user is None:
+            return None
+
+        avatar = user.display_avatar
+        return user.display_name, avatar.key, str(avatar.with_static_format('png').with_size(512))
     elif item['type'] == 'emoji':
         url = 'https://discordapp.com/api/emojis/{}.{}'
-        return item['name'], url.format(item['id'], 'gif' if item['animated'] else 'png')
+        return item['name'], 'emoji:{}'.format(item['id']), url.format(item['id'], 'gif' if item['animated'] else 'png')
     else:
         return None
@@ -7,13 +7,15 @@ from discord import Emoji, Embed, Member, Message, Reaction
 from discord.utils import utcnow
 
 from bot import Command, BotDatabase, GuildConfiguration, categories
+from bot.migrations import add_indexes
 from bot.utils import auto_int, compare_ids
 
 
 class Starboard(peewee.Model):
-    message_id = peewee.TextField()
+    message_id = peewee.CharField(max_length=32, index=True)
     starboard_id = peewee.TextField(default='')
     timestamp = peewee.DateTimeField(null=False)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
@@ -159,12 +161,8 @@ class StarboardHook(Command):
         if message.channel.is_nsfw() and config.get(cfg_starboard_nsfw, '0') == '0':
             return
 
-        try:
-            star_item = Starboard.get(Starboard.message_id == str(message.id))
-            is_update = True
-        except peewee.DoesNotExist:
-            star_item = None
-            is_update = False
+        star_item = await self.bot.db.run(Starboard.get_or_none, Starboard.message_id == str(message.id))
+        is_update = star_item is not None
 
         max_count = 0
         for reaction in message.reactions:
@@ -186,7 +184,7 @@ class StarboardHook(Command):
         starboard_chan = guild.get_channel(auto_int(starboard_chanid))
         if starboard_chan is None:
             if star_item is not None:
-                star_item.delete_instance()
+                await self.bot.db.run(star_item.delete_instance)
             self.log.debug('Channel ID %s not found for guild %s, starboard disabled.', starboard_chanid, user.guild)
             config.set(cfg_starboard_channel, '')
             return
@@ -207,8 +205,8 @@ class StarboardHook(Command):
             timestamp = utcnow()
             embed = self.create_embed(message, timestamp, footer_text)
             starboard_msg = await starboard_chan.send(embed=embed)
-            Starboard.insert(
-                message_id=message.id, timestamp=timestamp, starboard_id=starboard_msg.id).execute()
+            query = Starboard.insert(message_id=message.id, timestamp=timestamp, starboard_id=starboard_msg.id)
+            await self.bot.db.run(query.execute)
 
     def create_embed(self, msg: Message, ts: datetime, footer_txt: str):
         embed = Embed()
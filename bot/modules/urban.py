@@ -19,6 +19,7 @@ class Urban(Command):
         self.help = '$[urban-help]'
         self.format = '$[urban-format]'
         self.category = categories.INFORMATION
+        self.http_cache_ttl = 3600
 
     async def handle(self, cmd):
         text = cmd.text if cmd.text != '' else cmd.lang.get('urban-default-word')
@@ -28,25 +29,25 @@ class Urban(Command):
             self.log.debug('Loading %s ...', (baseurl + text))
 
             await cmd.typing()
-            async with self.http.get(baseurl + text) as urlresp:
-                data = await urlresp.json()
-                if 'list' not in data or len(data['list']) == 0:
-                    await cmd.answer('$[urban-error-fetch]')
-                    return
-
-                result = data['list'][0]
-                result['definition'] = Urban.reformat(result['definition'])
-                result['example'] = Urban.reformat(result['example'])
-
-                embed = Embed()
-                embed.title = result['word']
-                embed.url = result['permalink']
-                desc = '$[urban-cont-by] {}\n\n$[urban-cont-definition]\n{}\n\n$[urban-cont-example]\n{}'
-                embed.description = desc.format(result['author'], result['definition'], result['example'])
-                embed.set_footer(text='👍 {}  👎 {}'.format(result['thumbs_up'], result['thumbs_down']))
-
-                await cmd.answer(embed=embed)
+            urlresp = await self.fetch(baseurl + text)
+            data = urlresp.json()
+            if 'list' not in data or len(data['list']) == 0:
+                await cmd.answer('$[urban-error-fetch]')
                 return
+
+            result = data['list'][0]
+            result['definition'] = Urban.reformat(result['definition'])
+            result['example'] = Urban.reformat(result['example'])
+
+            embed = Embed()
+            embed.title = result['word']
+            embed.url = result['permalink']
+            desc = '$[urban-cont-by] {}\n\n$[urban-cont-definition]\n{}\n\n$[urban-cont-example]\n{}'
+            embed.description = desc.format(result['author'], result['definition'], result['example'])
+            embed.set_footer(text='👍 {}  👎 {}'.format(result['thumbs_up'], result['thumbs_down']))
+
+            await cmd.answer(embed=embed)
+            return
         except Exception as e:
             self.log.error(e)
             raise e
@@ -2,14 +2,16 @@ from datetime import datetime
 
 import peewee
 from bot import Command, BotDatabase
+from bot.migrations import add_indexes
 
 optout_cache = {}
 noopt_cache = set()
 
 
 class UserLogOptOut(peewee.Model):
-    userid = peewee.TextField()
+    userid = peewee.CharField(max_length=32, index=True)
     timestamp = peewee.DateTimeField(default=datetime.now)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
@@ -2,16 +2,18 @@ import discord
 import peewee
 
 from bot import Command, BotDatabase, categories
+from bot.migrations import add_indexes
 
 
 class UserNote(peewee.Model):
-    userid = peewee.TextField()
-    serverid = peewee.TextField()
+    userid = peewee.CharField(max_length=32)
+    serverid = peewee.CharField(max_length=32)
     note = peewee.TextField(default='')
-
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
+        indexes = ((('serverid', 'userid'), False),)
 
 
 class UserNoteCmd(Command):
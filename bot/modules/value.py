@@ -1,4 +1,6 @@
 import re
+import time
+from collections import Counter
 
 from bot import Command, categories, settings
 from bot.utils import is_float
@@ -14,10 +16,20 @@ localsbif = ['uf', 'utm']
 cryptomemes = ['btc', 'xmr', 'eth', 'ltc', 'xlm', 'xrp', 'bch', 'dash', 'doge']
 cryptoclp = ['cha', 'luk']
 
+# Time in seconds that the retrieved rates are used, by default and for the SBIF indicators (updated daily)
+rate_ttl = 300
+rate_ttl_sbif = 3600
+
 
 class Value(Command):
     __author__ = 'makzk'
-    __version__ = '1.0.0'
+    __version__ = '1.1.0'
+
+    # Maximum amount of requests to a service for a single rate. Responses are not cached, as the rates are
+    # kept on the rate store once they're validated.
+    max_attempts = 3
+    # Amount of the most used rates that are refreshed in the background
+    refresh_rates = 10
 
     def __init__(self, bot):
         super().__init__(bot)
@@ -32,6 +44,8 @@ class Value(Command):
             'currency_apikey': ''
         }
 
+        self.schedule = (self.refresh_task, 120)
+        self.rates = RateStore()
         self.div_handlers = {}
 
         for m in cryptomemes:
@@ -110,7 +124,9 @@ class Value(Command):
             div_to = div_to.upper()
 
             await cmd.typing()
-            result = await self.handler(div_from, div_to, mult)
+            # Concurrent requests for the same conversion share the same retrieval
+            rate = await self.bot.web.flights.run(('value', div_from, div_to), self.handler, div_from, div_to, 1)
+            result = rate * mult
         except DivRetrievalError as e:
             await cmd.answer('$[error]', locales={'errortext': str(e)})
             return
@@ -124,15 +140,59 @@ class Value(Command):
     Handles different types of currency supported by the different APIs connected here
     """
     async def handler(self, dv_from, dv_to, mult):
+        if dv_from == dv_to:
+            return mult
+
+        # Known rates are used directly or combined, before requesting anything
+        rate = self.rates.get(dv_from, dv_to)
+        if rate is not None:
+            return rate * mult
+
         if dv_from in self.div_handlers:
-            handler, default_to = self.div_handlers[dv_from]
-            val = await handler(dv_from)
+            _, default_to = self.div_handlers[dv_from]
+            val = await self.load_rate(dv_from, default_to)
             return await self.handler(default_to, dv_to, mult * val)
 
-        if dv_from == dv_to:
-            return mult
+        if dv_to in self.div_handlers:
+            return mult / await self.handler(dv_to, dv_from, 1)
+
+        return await self.load_rate(dv_from, dv_to) * mult
+
+    async def load_rate(self, dv_from, dv_to):
+        """
+        Retrieves a rate from its service, and stores it on the rate store.
+        :param dv_from: The source currency.
+        :param dv_to: The target currency. For currencies with their own handler, it must be the handler's currency.
+        :return: The rate value.
+        """
+        ttl = rate_ttl
+        if dv_from in self.div_handlers:
+            handler, _ = self.div_handlers[dv_from]
+            if handler == self.sbif:
+                ttl = rate_ttl_sbif
+            value = await handler(dv_from)
+        else:
+            value = await self.convert(dv_from, dv_to)
 
-        return await self.convert(dv_from, dv_to) * mult
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise DivRetrievalError('$[value-error-answer]')
+
+        self.rates.set(dv_from, dv_to, value, ttl)
+        return value
+
+    async def refresh_task(self):
+        """
+        Refreshes the most used rates that are about to expire, so they're ready when they're requested.
+        """
+        for dv_from, dv_to in self.rates.popular(self.refresh_rates, expiring_in=120):
+            try:
+                await self.bot.web.flights.run(('value-rate', dv_from, dv_to), self.load_rate, dv_from, dv_to)
+            except DivRetrievalError as e:
+                self.log.debug('Could not refresh the %s-%s rate: %s', dv_from, dv_to, e)
+            except Exception as e:
+                self.log.warning('Could not refresh the %s-%s rate: %s', dv_from, dv_to, e)
 
     #
     # Services readers
@@ -144,63 +204,61 @@ class Value(Command):
 
         attempts = 0
         url = baseurl.format(div1, div2, settings.currency_api_key)
-        while attempts < 10:
+        while attempts < self.max_attempts:
             self.log.debug('Loading currency data, attempt ' + str(attempts + 1))
             self.log.debug('Loading URL %s', url)
-            async with self.http.get(url) as r:
-                data = await r.json()
-                if r.status != 200:
-                    attempts += 1
-                    continue
-
-                try:
-                    k = 'Realtime Currency Exchange Rate'
-                    if k not in data.keys():
-                        if 'Error Message' in data.keys() and data['Error Message'].startswith('Invalid API call.'):
-                            raise DivRetrievalError('$[value-error-currency]')
-                        else:
-                            raise DivRetrievalError('$[value-error-answer]')
+            r = await self.fetch(url)
+            if r.status != 200:
+                attempts += 1
+                continue
+
+            try:
+                data = r.json()
+                k = 'Realtime Currency Exchange Rate'
+                if k not in data.keys():
+                    if 'Error Message' in data.keys() and data['Error Message'].startswith('Invalid API call.'):
+                        raise DivRetrievalError('$[value-error-currency]')
                     else:
-                        j = '5. Exchange Rate'
-                        if j not in data[k].keys():
-                            raise DivRetrievalError('$[value-error-answer]')
+                        raise DivRetrievalError('$[value-error-answer]')
+                else:
+                    j = '5. Exchange Rate'
+                    if j not in data[k].keys():
+                        raise DivRetrievalError('$[value-error-answer]')
 
-                        value = float(data[k][j])
-                except ValueError as e:
-                    self.log.exception(e)
-                    raise DivRetrievalError('$[value-error-unavailable]')
+                    value = float(data[k][j])
+            except ValueError as e:
+                self.log.exception(e)
+                raise DivRetrievalError('$[value-error-unavailable]')
 
-                return value
+            return value
+
+        raise DivRetrievalError('$[value-error-unavailable]')
 
     async def convert_crypto(self, meme):
         return await self.convert(meme, 'USD')
 
     async def sbif(self, api):
-        # TODO: Cache
         attempts = 0
         if not settings.sbif_api_key:
             raise DivRetrievalError('$[value-error-sbif-key]')
 
         url = baseurl_sbif.format(api.lower(), settings.sbif_api_key)
 
-        while attempts < 10:
-            async with self.http.get(url) as r:
-                try:
-                    data = await r.json(content_type='text/json')
-                except TypeError:
-                    data = await r.json()
+        while attempts < self.max_attempts:
+            r = await self.fetch(url)
+            if r.status != 200:
+                attempts += 1
+                continue
 
-                if r.status != 200:
-                    attempts += 1
-                    continue
+            try:
+                campo = api.upper() + 's'
+                value = float(r.json()[campo][0]['Valor'].replace('.', '').replace(',', '.'))
+            except (KeyError, IndexError, ValueError):
+                raise DivRetrievalError('$[value-error-sbif]')
 
-                try:
-                    campo = api.upper() + 's'
-                    value = float(data[campo][0]['Valor'].replace('.', '').replace(',', '.'))
-                except (KeyError, ValueError):
-                    raise DivRetrievalError('$[value-error-sbif]')
+            return value
 
-                return value
+        raise DivRetrievalError('$[value-error-unavailable]')
 
     async def orionx(self, meme):
         q = [{
@@ -209,13 +267,15 @@ class Value(Command):
         }]
 
         self.log.debug('Loading url %s for %s', baseurl_orionx, meme + "CLP")
-        async with self.http.post(baseurl_orionx, json=q, headers={'fingerprint': 'xd'}) as r:
-            try:
-                data = await r.json()
-                return data[0]['data']['market']['lastTrade']['price']
-            except KeyError:
-                raise DivRetrievalError('$[value-error-data-not-available]')
-        return 0
+        r = await self.fetch(baseurl_orionx, method='POST', json=q, headers={'fingerprint': 'xd'})
+        if r.status != 200:
+            raise DivRetrievalError('$[value-error-unavailable]')
+
+        try:
+            data = r.json()
+            return data[0]['data']['market']['lastTrade']['price']
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise DivRetrievalError('$[value-error-data-not-available]')
 
     def valid_currency(self, curr):
         if not isinstance(curr, str):
@@ -225,5 +285,88 @@ class Value(Command):
         return curr in self.div_handlers.keys() or pat_currency.match(curr)
 
 
+class RateStore:
+    """
+    Keeps the recently retrieved exchange rates with their retrieval time. Rates that were not retrieved
+    directly are derived from the known ones, using their inverse or combining them through other
+    currencies (e.g. BTC-CLP from BTC-USD and USD-CLP).
+    """
+    # Maximum amount of rates combined to derive a rate
+    max_hops = 3
+
+    def __init__(self):
+        self.rates = {}
+        self.uses = Counter()
+        self.hits = 0
+        self.misses = 0
+
+    def set(self, div_from, div_to, value, ttl):
+        """
+        Stores a retrieved rate.
+        :param div_from: The source currency.
+        :param div_to: The target currency.
+        :param value: The rate value.
+        :param ttl: The time in seconds that the rate can be used.
+        """
+        self.rates[(div_from, div_to)] = (value, time.time() + ttl)
+
+    def get(self, div_from, div_to):
+        """
+        Retrieves a rate, from the stored rates that are not expired. The rate is searched with the least
+        amount of combined rates.
+        :param div_from: The source currency.
+        :param div_to: The target currency.
+        :return: The rate value, or None if it can't be derived from the known rates.
+        """
+        if div_from == div_to:
+            return 1.0
+
+        now = time.time()
+        graph = {}
+        for (a, b), (value, expires) in self.rates.items():
+            if expires > now and value != 0:
+                graph.setdefault(a, []).append((b, value, (a, b)))
+                graph.setdefault(b, []).append((a, 1 / value, (a, b)))
+
+        # Breadth-first search, keeping the accumulated rate and the used pairs of every path
+        visited = {div_from}
+        paths = [(div_from, 1.0, ())]
+        for _ in range(self.max_hops):
+            next_paths = []
+            for currency, rate, pairs in paths:
+                for other, value, pair in graph.get(currency, []):
+                    if other in visited:
+                        continue
+                    if other == div_to:
+                        self.hits += 1
+                        self.uses.update(pairs + (pair,))
+                        return rate * value
+
+                    visited.add(other)
+                    next_paths.append((other, rate * value, pairs + (pair,)))
+            paths = next_paths
+
+        self.misses += 1
+        return None
+
+    def popular(self, amount, expiring_in=0):
+        """
+        Retrieves the most used stored rates. The usage counts are halved on every call, so the rates that
+        are not used anymore are eventually left out.
+        :param amount: The maximum amount of rates.
+        :param expiring_in: If set, only the rates that expire within this time in seconds are returned.
+        :return: A list of (source, target) currency tuples.
+        """
+        limit = time.time() + expiring_in
+        result = [pair for pair, _ in self.uses.most_common()
+                  if pair in self.rates and (expiring_in <= 0 or self.rates[pair][1] <= limit)][:amount]
+
+        self.uses = Counter({pair: uses // 2 for pair, uses in self.uses.items() if uses > 1})
+        return result
+
+    def metrics(self):
+        return {'rates': len(self.rates), 'hits': self.hits, 'misses': self.misses}
+
+
 class DivRetrievalError(BaseException):
     pass
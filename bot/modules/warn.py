@@ -5,17 +5,20 @@ import peewee
 from discord import Embed
 
 from bot import Command, BotDatabase, categories
+from bot.migrations import add_indexes
 from bot.utils import is_int
 
 
 class UserWarn(peewee.Model):
-    serverid = peewee.TextField()
-    userid = peewee.TextField()
+    serverid = peewee.CharField(max_length=32)
+    userid = peewee.CharField(max_length=32)
     reason = peewee.TextField()
     timestamp = peewee.DateTimeField(default=datetime.now)
+    schema_migrations = [add_indexes]
 
     class Meta:
         database = BotDatabase().db
+        indexes = ((('serverid', 'userid'), False),)
 
 
 class Warn(Command):
@@ -52,8 +55,8 @@ class Warn(Command):
             return
 
         reason = ' '.join(cmd.args[1:])
-        UserWarn.create(serverid=guild.id, userid=member.id, reason=reason)
-        num = get_member_warns(member).count()
+        await self.bot.db.run(UserWarn.create, serverid=guild.id, userid=member.id, reason=reason)
+        num = await self.bot.db.run(get_member_warns(member).count)
         adv = ['$[warn-now]', '$[warn-now-single]'][num == 1]
 
         # Tell user via PM about the warn
@@ -11,6 +11,7 @@ class Weather(Command):
         self.help = '$[weather-help]'
         self.format = '$[weather-format]'
         self.category = categories.INFORMATION
+        self.http_cache_ttl = 600
         self.urlbase = 'http://api.openweathermap.org/data/2.5/weather?q='
         self.default_config = {
             'weatherapi_key': ''
@@ -37,34 +38,34 @@ class Weather(Command):
         self.log.debug('Loading ' + url)
 
         await cmd.typing()
-        async with self.http.get(url) as r:
-            if r.status != 200:
-                if r.status == 404:
-                    await cmd.answer('$[weather-error-not-found]')
-                    return
-                if r.status == 401:
-                    await cmd.answer('$[weather-error-key]')
-                    return
-                else:
-                    await cmd.answer('$[weather-error]', locales={'error': r.status})
-                    return
-
-            data = await r.json()
-            if 'deg' in data['wind']:
-                wind = '{} m/s ({}º)'.format(data['wind']['speed'], data['wind']['deg'])
+        r = await self.fetch(url)
+        if r.status != 200:
+            if r.status == 404:
+                await cmd.answer('$[weather-error-not-found]')
+                return
+            if r.status == 401:
+                await cmd.answer('$[weather-error-key]')
+                return
             else:
-                wind = '{} m/s'.format(data['wind']['speed'])
+                await cmd.answer('$[weather-error]', locales={'error': r.status})
+                return
+
+        data = r.json()
+        if 'deg' in data['wind']:
+            wind = '{} m/s ({}º)'.format(data['wind']['speed'], data['wind']['deg'])
+        else:
+            wind = '{} m/s'.format(data['wind']['speed'])
 
-            e = Embed(colour=12608321)
-            e.description = ':flag_{}: $[weather-title]'.format(data['sys']['country'].lower())
-            e.set_footer(text='$[weather-footer] (https://openweathermap.org/)',
-                         icon_url='https://openweathermap.org/themes/openweathermap/'
-                                  'assets/vendor/owm/img/icons/logo_60x60.png')
-            e.add_field(name='$[weather-f-status]', value=data['weather'][0]['description'])
-            e.add_field(name='$[weather-f-temp]', value='{} ºC'.format(data['main']['temp']))
-            e.add_field(name='$[weather-f-pressure]', value='{} hPa'.format(data['main']['pressure']))
-            e.add_field(name='$[weather-f-humidity]', value='{}%'.format(data['main']['humidity']))
-            e.add_field(name='$[weather-f-wind]', value=wind)
-            e.add_field(name='$[weather-f-clouds]', value='{}%'.format(data['clouds']['all']))
-            e.set_thumbnail(url='http://openweathermap.org/img/w/{}.png'.format(data['weather'][0]['icon']))
-            await cmd.answer(embed=e, locales={'location': data['name']})
+        e = Embed(colour=12608321)
+        e.description = ':flag_{}: $[weather-title]'.format(data['sys']['country'].lower())
+        e.set_footer(text='$[weather-footer] (https://openweathermap.org/)',
+                     icon_url='https://openweathermap.org/themes/openweathermap/'
+                              'assets/vendor/owm/img/icons/logo_60x60.png')
+        e.add_field(name='$[weather-f-status]', value=data['weather'][0]['description'])
+        e.add_field(name='$[weather-f-temp]', value='{} ºC'.format(data['main']['temp']))
+        e.add_field(name='$[weather-f-pressure]', value='{} hPa'.format(data['main']['pressure']))
+        e.add_field(name='$[weather-f-humidity]', value='{}%'.format(data['main']['humidity']))
+        e.add_field(name='$[weather-f-wind]', value=wind)
+        e.add_field(name='$[weather-f-clouds]', value='{}%'.format(data['clouds']['all']))
+        e.set_thumbnail(url='http://openweathermap.org/img/w/{}.png'.format(data['weather'][0]['icon']))
+        await cmd.answer(embed=e, locales={'location': data['name']})
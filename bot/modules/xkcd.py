@@ -12,6 +12,7 @@ class XKCD(Command):
         self.help = '$[xkcd-help]'
         self.format = '$[xkcd-format]'
         self.category = categories.FUN
+        self.http_cache_ttl = 86400
         self.xkcd_current = None
         self.xkcd_comic = []
 
@@ -23,15 +24,15 @@ class XKCD(Command):
         if arg.isdigit():
             if 0 < int(arg) <= self.xkcd_current['num']:
                 await cmd.typing()
-                async with self.http.get(baseurl.format(arg)) as r:
-                    self.xkcd_comic = await r.json()
+                r = await self.fetch(baseurl.format(arg))
+                self.xkcd_comic = r.json()
             else:
                 await cmd.answer('$[xkcd-err-outofbounds]')
                 return
         elif arg == 'random':
             xkcd_random = random.randint(1, self.xkcd_current['num'])
-            async with self.http.get(baseurl.format(xkcd_random)) as r:
-                self.xkcd_comic = await r.json()
+            r = await self.fetch(baseurl.format(xkcd_random))
+            self.xkcd_comic = r.json()
         elif len(arg) == 0 or arg == 'current':
             await cmd.typing()
             self.xkcd_comic = self.xkcd_current
@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+import discord
+
+from bot import GuildConfiguration, settings
+
+Route = namedtuple('Route', ['prefix', 'cmdname', 'subcmd', 'command', 'is_alias', 'swhandlers'])
+
+
+class MessageRouter:
+    """
+    Matches a message against the loaded commands and starts-with handlers in a single pass. The starts-with
+    handlers texts are compiled into a prefix trie for every command prefix in use, and the tries are kept
+    until the loaded commands or handlers change. The result of the last matched message is kept too, so
+    the command and starts-with handlers can share it.
+    """
+    max_prefixes = 256
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._tries = {}
+        self._last = None
+
+    def invalidate(self):
+        """
+        Discards the compiled tries. Must be called when commands or starts-with handlers are added or removed.
+        """
+        self._tries = {}
+        self._last = None
+
+    @staticmethod
+    def get_prefix(message):
+        if isinstance(message.channel, discord.DMChannel):
+            return settings.command_prefix
+        else:
+            return GuildConfiguration.get_instance(message.channel.guild).prefix
+
+    def match(self, message):
+        """
+        Finds the command and the starts-with handlers triggered by a message.
+        :param message: The discord.Message to route.
+        :return: A Route with the command name, sub-command, the command's module instance (None if the message
+        is not a command), if the command name is an alias, and the starts-with handlers matching the message
+        in the order they were registered.
+        """
+        content = message.content
+        prefix = self.get_prefix(message)
+
+        last = self._last
+        if last is not None and last[0] == message.id and last[1] == content and last[2] == prefix:
+            return last[3]
+
+        # Walk the trie through the message content, collecting the handlers of every matched text
+        matches = []
+        node = self._get_trie(prefix)
+        for char in content:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                matches.extend(node[None])
+
+        matches.sort(key=lambda m: m[0])
+        swhandlers = tuple(handler for _, handler in matches)
+
+        cmdname, subcmd, command = '', '', None
+        if content.startswith(prefix):
+            cmd_parts = content[len(prefix):].split(' ', 1)[0].split(':')
+            cmdname = cmd_parts[0]
+            subcmd = '' if len(cmd_parts) < 2 else cmd_parts[1]
+            command = self.bot.cmds.get(cmdname)
+
+        is_alias = command is not None and cmdname != command.name
+        route = Route(prefix, cmdname, subcmd, command, is_alias, swhandlers)
+        self._last = (message.id, content, prefix, route)
+        return route
+
+    def _get_trie(self, prefix):
+        trie = self._tries.get(prefix)
+        if trie is not None:
+            return trie
+
+        if len(self._tries) >= self.max_prefixes:
+            self._tries = {}
+
+        trie = {}
+        for idx, (swtext, handler) in enumerate(self.bot.swhandlers.items()):
+            node = trie
+            for char in swtext.replace('$PX', prefix):
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append((idx, handler))
+
+        self._tries[prefix] = trie
+        return trie
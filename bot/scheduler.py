@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+from bot.logger import new_logger
+
+log = new_logger('Scheduler')
+
+# Repetition modes. On fixed rate, runs are scheduled from the previous scheduled time. On fixed delay,
+# runs are scheduled from the end of the previous run.
+FIXED_RATE = 'rate'
+FIXED_DELAY = 'delay'
+
+# What to do with fixed rate runs missed because the loop was busy, or the previous run was still running.
+# On skip, missed runs are dropped and the next run is aligned to the original schedule. On coalesce, all
+# the missed runs are merged into a single run, executed as soon as possible.
+MISSED_SKIP = 'skip'
+MISSED_COALESCE = 'coalesce'
+
+
+class ScheduledTask:
+    """
+    A task handled by the TaskScheduler. Keeps the task's schedule options and its run metrics.
+    """
+
+    def __init__(self, scheduler, name, func, interval=0, mode=FIXED_RATE, jitter=0, missed=MISSED_SKIP):
+        if interval < 0:
+            raise ValueError('Task interval time must be positive')
+        if mode not in [FIXED_RATE, FIXED_DELAY]:
+            raise ValueError('Invalid task mode: {}'.format(mode))
+        if missed not in [MISSED_SKIP, MISSED_COALESCE]:
+            raise ValueError('Invalid missed runs policy: {}'.format(missed))
+
+        self.scheduler = scheduler
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.mode = mode
+        self.jitter = max(jitter, 0)
+        self.missed = missed
+        self.base_time = 0.0
+        self.running = None
+        self.cancelled = False
+
+        # Metrics
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.last_lag = None
+        self.last_error = None
+
+    def cancel(self):
+        """
+        Stops the task from being run again, and cancels the current run, if it's running.
+        """
+        self.cancelled = True
+        if self.running is not None and not self.running.done():
+            self.running.cancel()
+
+    def is_running(self):
+        return self.running is not None and not self.running.done()
+
+    def metrics(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_duration': self.last_duration,
+            'last_lag': self.last_lag,
+            'last_error': self.last_error
+        }
+
+
+class TaskScheduler:
+    """
+    Runs tasks on the running event loop, once or every given interval. Pending runs are kept on a heap ordered
+    by their due time, and a single runner coroutine sleeps until the next one is due. A task is never run while
+    its previous run is still running.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # Every task that can still run. Fixed delay tasks are not on the heap while they're running.
+        self._tasks = set()
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._runner = None
+
+    def add(self, name, func, interval=0, delay=0, **options):
+        """
+        Schedules a task.
+        :param name: The task name, used for logging.
+        :param func: The coroutine function to run.
+        :param interval: The time in seconds to repeat the task. If it's zero, the task is run only once.
+        :param delay: The time in seconds to wait before the first run.
+        :param options: The ScheduledTask options: mode, jitter and missed.
+        :return: The ScheduledTask instance.
+        """
+        task = ScheduledTask(self, name, func, interval, **options)
+        task.base_time = time.monotonic() + delay
+        self._tasks.add(task)
+        self._push(task)
+        self.start()
+        return task
+
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Cancels every task, including the ones that are running, and waits for their runs to end.
+        """
+        # A task could be stopping the scheduler, so it's not cancelled or waited
+        current = asyncio.current_task()
+        runs = []
+        for task in self._tasks:
+            if task.running is current:
+                task.cancelled = True
+                continue
+
+            if task.is_running():
+                runs.append(task.running)
+            task.cancel()
+
+        self._tasks = set()
+        self._heap = []
+        if self._runner is not None:
+            self._runner.cancel()
+            runs.append(self._runner)
+            self._runner = None
+
+        await asyncio.gather(*runs, return_exceptions=True)
+
+    def _push(self, task):
+        due = task.base_time
+        if task.jitter > 0:
+            due += random.uniform(0, task.jitter)
+
+        heapq.heappush(self._heap, (due, next(self._counter), task))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if len(self._heap) == 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, _, task = self._heap[0]
+            if task.cancelled:
+                heapq.heappop(self._heap)
+                continue
+
+            now = time.monotonic()
+            if due > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._dispatch(task, due, now)
+
+    def _dispatch(self, task, due, now):
+        if task.is_running():
+            task.skipped += 1
+            log.debug('Task "%s" is still running, skipping this run', task.name)
+        else:
+            task.last_lag = now - due
+            task.running = asyncio.get_running_loop().create_task(self._execute(task))
+
+        if task.mode == FIXED_RATE and task.interval > 0:
+            next_time = task.base_time + task.interval
+            if next_time <= now:
+                if task.missed == MISSED_SKIP:
+                    missed = int((now - next_time) // task.interval) + 1
+                    next_time += missed * task.interval
+                    task.skipped += missed
+                else:
+                    next_time = now
+
+            task.base_time = next_time
+            self._push(task)
+
+    async def _execute(self, task):
+        start = time.monotonic()
+        try:
+            await task.func()
+            task.runs += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            task.failures += 1
+            task.last_error = repr(e)
+            log.error('Task "%s" failed', task.name)
+            log.exception(e)
+        finally:
+            end = time.monotonic()
+            task.last_duration = end - start
+
+            if task.mode == FIXED_DELAY and task.interval > 0 and not task.cancelled:
+                task.base_time = end + task.interval
+                self._push(task)
+            elif task.interval == 0 or task.cancelled:
+                self._tasks.discard(task)
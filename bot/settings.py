@@ -17,6 +17,10 @@ def tryint(val, default=None):
 base_dir = pathlib.Path(__file__).parent.parent
 debug = getenv('DEBUG', '') == '1'
 database_url = getenv('DATABASE_URL', 'sqlite:///database.db')
+database_threads = tryint(getenv('DATABASE_THREADS'), 0)
+database_slow_query = tryint(getenv('DATABASE_SLOW_QUERY_MS'), 250)
+database_warn_sync = getenv('DATABASE_WARN_SYNC', '') == '1'
+counter_flush_interval = tryint(getenv('COUNTER_FLUSH_INTERVAL'), 5)
 discord_token = getenv('DISCORD_TOKEN')
 chunk_guilds = getenv('CHUNK_GUILDS', '') == '1'
 
@@ -25,6 +29,7 @@ owner_role = getenv('OWNER_ROLE', 'AlexisMaster')
 bot_owners = s2l(getenv('BOT_OWNERS', '130324995984326656'))
 
 default_language = getenv('DEFAULT_LANGUAGE', 'es_CL')
+lang_bundle = getenv('LANG_BUNDLE', '1') == '1'
 
 log_to_file = getenv('LOG_TO_FILE', '') == '1'
 log_path = getenv('LOG_PATH', 'alexisbot.log')
@@ -39,6 +44,32 @@ blocklist_servers = s2l(getenv('BLOCKLIST_SERVERS'))
 
 command_guilds = s2l(getenv('COMMAND_GUILDS'))
 
+event_dispatch_concurrent = getenv('EVENT_DISPATCH_CONCURRENT', '1') == '1'
+event_handler_timeout = tryint(getenv('EVENT_HANDLER_TIMEOUT'), 60)
+
+config_preload = getenv('CONFIG_PRELOAD', '1') == '1'
+config_write_behind = getenv('CONFIG_WRITE_BEHIND', '1') == '1'
+config_flush_interval = tryint(getenv('CONFIG_FLUSH_INTERVAL'), 5)
+
+http_timeout = tryint(getenv('HTTP_TIMEOUT'), 15)
+http_limit = tryint(getenv('HTTP_LIMIT'), 100)
+http_limit_per_host = tryint(getenv('HTTP_LIMIT_PER_HOST'), 10)
+http_dns_cache_ttl = tryint(getenv('HTTP_DNS_CACHE_TTL'), 300)
+http_keepalive = tryint(getenv('HTTP_KEEPALIVE'), 30)
+http_cache_size = tryint(getenv('HTTP_CACHE_SIZE_KB'), 16384)
+http_cache_dir = getenv('HTTP_CACHE_DIR', '')
+
+worker_processes = tryint(getenv('WORKER_PROCESSES'), 0)
+worker_queue_size = tryint(getenv('WORKER_QUEUE_SIZE'), 0)
+worker_queue_timeout = tryint(getenv('WORKER_QUEUE_TIMEOUT'), 10)
+worker_start_method = getenv('WORKER_START_METHOD', 'spawn')
+
+avatar_cache_size = tryint(getenv('AVATAR_CACHE_SIZE_KB'), 32768)
+avatar_cache_disk = tryint(getenv('AVATAR_CACHE_DISK_MB'), 256)
+latex_cache_disk = tryint(getenv('LATEX_CACHE_DISK_MB'), 64)
+asset_cache_disk = tryint(getenv('ASSET_CACHE_DISK_MB'), 128)
+asset_revalidate = tryint(getenv('ASSET_REVALIDATE'), 86400)
+
 # Modules values
 weatherapi_key = getenv('WEATHERAPI_KEY')
 twitter_api_key = getenv('TWITTER_API_KEY')
@@ -1,13 +1,13 @@
 import datetime
-from os import path, mkdir, stat
 
-import aiohttp
 import discord
 import re
 from discord import Embed, Colour, Message
 
 from bot import constants
 from bot.logger import new_logger
+from bot.assets import AssetManager
+from bot.web import WebClient
 from bot.regex import pat_tag, pat_usertag, pat_channel, pat_emoji, pat_colour, pat_delta_each, pat_invite
 
 log = new_logger('Utils')
@@ -391,48 +391,21 @@ def message_link(message: Message):
 
 
 def get_session():
-    headers = {'User-Agent': f'AlexisBot/{constants.BOT_VERSION} +https://alexisbot.mak.wtf'}
-    return aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=15))
+    """
+    :return: The bot's default HTTP session. It's shared, so it must not be closed.
+    """
+    return WebClient().session()
 
 
 async def download(filename, url, filesize=None):
-    basedir = path.abspath(path.join(path.dirname(path.realpath(__file__)), '..', 'cache'))
-    if not path.exists(basedir):
-        try:
-            mkdir(basedir)
-        except Exception as e:
-            log.error('Could not create cache directory')
-            log.exception(e)
-            return None
-
-    filepath = path.join(basedir, filename)
-    if path.exists(filepath):
-        if filesize is None:
-            return filepath
-
-        fs = stat(filepath)
-        if fs.st_size == filesize:
-            return filepath
-
-    try:
-        log.debug('Downloading %s from %s', filename, url)
-        async with get_session() as s:
-            async with s.get(url) as r:
-                log.info('File %s downloaded', filename)
-                data = await r.read()
-                try:
-                    with open(filepath, 'wb') as f:
-                        f.write(data)
-                        log.info('File %s stored to %s', filename, filepath)
-                        return filepath
-                except OSError as e:
-                    log.error('Could not store %s file', filename)
-                    log.exception(e)
-                    return None
-    except Exception as e:
-        log.error('Could not download the %s file', filename)
-        log.exception(e)
-        return None
+    """
+    Retrieves a file stored on the cache directory, downloading it if it's not stored. See AssetManager.get.
+    :param filename: The local file name.
+    :param url: The file URL.
+    :param filesize: The expected file size, in bytes.
+    :return: The file path, or None if it could not be retrieved.
+    """
+    return await AssetManager().get(filename, url, size=filesize)
 
 
 def lazy_property(fn):
@@ -0,0 +1,357 @@
+import asyncio
+import hashlib
+import json
+import marshal
+import time
+from pathlib import Path
+
+import aiohttp
+from yarl import URL
+
+from bot import settings
+from bot.cache import LRUCache, SingleFlight
+from bot.logger import new_logger
+
+log = new_logger('Web')
+
+
+class WebClient:
+    """
+    HTTP client shared by the whole bot. Every session created here uses the same connection pool, so
+    connections, TLS sessions and DNS lookups are reused between modules, while each named session keeps
+    its own headers (like the User-Agent) and cookies.
+    """
+    _ins = None
+
+    def __new__(cls):
+        if cls._ins is None:
+            cls._ins = super().__new__(cls)
+        return cls._ins
+
+    def __init__(self):
+        # The instance is shared, so it's initialized only once
+        if hasattr(self, 'sessions'):
+            return
+
+        self.user_agent = 'AlexisBot (https://alexisbot.mak.wtf/)'
+        self.sessions = {}
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0
+        }
+        self._connector = None
+        self._trace = self._create_trace_config()
+        self.flights = SingleFlight()
+        self.cache = ResponseCache(self)
+
+    @property
+    def connector(self):
+        """
+        The connection pool, created on its first use, as it needs a running event loop.
+        """
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=settings.http_limit,
+                limit_per_host=settings.http_limit_per_host,
+                ttl_dns_cache=settings.http_dns_cache_ttl,
+                keepalive_timeout=settings.http_keepalive
+            )
+        return self._connector
+
+    def session(self, name=None, user_agent=None, cookies=True):
+        """
+        Retrieves a session that uses the shared connection pool. Sessions are kept by name, so the same
+        session is returned to every caller using the same name. Sessions must not be closed by the callers,
+        they're closed along with the bot.
+        :param name: The session name. If it's not set, the default session is used.
+        :param user_agent: The session's User-Agent header. If not set, the bot's User-Agent is used.
+        :param cookies: If the session should store cookies.
+        :return: The aiohttp.ClientSession instance.
+        """
+        session = self.sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=self.connector,
+                connector_owner=False,
+                headers={'User-Agent': user_agent or self.user_agent},
+                cookie_jar=aiohttp.CookieJar(unsafe=True) if cookies else aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=settings.http_timeout),
+                trace_configs=[self._trace]
+            )
+            self.sessions[name] = session
+
+        return session
+
+    def session_name(self, session):
+        """
+        :return: The name a session was created with, or None for the default session.
+        """
+        for name, item in self.sessions.items():
+            if item is session:
+                return name
+
+        return None
+
+    async def fetch(self, session, url, ttl=0, stale_ttl=None, method='GET', cache_post=False, **kwargs):
+        """
+        Makes a request and reads its response, using the response cache. See ResponseCache.fetch.
+        Concurrent GET requests to the same URL share a single request, even if they're not cached.
+        Requests with other methods are never cached or shared, except POST requests with cache_post set.
+        :param session: The session used for the request.
+        :param url: The request URL.
+        :param ttl: The time in seconds to keep the response. If it's zero, the cache is not used.
+        :param stale_ttl: The time in seconds an expired response can be used while it's refreshed.
+        :param method: The request method.
+        :param cache_post: If the response of a POST request can be cached and shared. It must only be set for
+        requests that just read data, like queries made with POST because of their size or format.
+        :param kwargs: The request options (data, json, params, headers, etc).
+        :return: A CachedResponse instance.
+        """
+        method = method.upper()
+        if method not in ['GET', 'HEAD'] and not (method == 'POST' and cache_post):
+            return await self.cache.request(session, method, url, kwargs)
+
+        if ttl <= 0:
+            key = ('request', self.cache.make_key(session, method, url, kwargs))
+            return await self.flights.run(key, self.cache.request, session, method, url, kwargs)
+
+        return await self.cache.fetch(session, url, ttl, stale_ttl, method, **kwargs)
+
+    def pool_stats(self):
+        """
+        :return: A dict with the connection pool settings, the amount of open sessions and the request metrics.
+        """
+        return {
+            'limit': settings.http_limit,
+            'limit_per_host': settings.http_limit_per_host,
+            'sessions': len([s for s in self.sessions.values() if not s.closed]),
+            'collapsed': self.flights.collapsed,
+            **self.stats
+        }
+
+    async def close(self):
+        for session in self.sessions.values():
+            if not session.closed:
+                await session.close()
+
+        self.sessions = {}
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+        await self.cache.close()
+
+    def _create_trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        def counter(stat):
+            async def count(*_):
+                self.stats[stat] += 1
+            return count
+
+        trace.on_request_start.append(counter('requests'))
+        trace.on_request_exception.append(counter('errors'))
+        trace.on_connection_create_end.append(counter('connections_created'))
+        trace.on_connection_reuseconn.append(counter('connections_reused'))
+        trace.on_dns_cache_hit.append(counter('dns_cache_hits'))
+        trace.on_dns_cache_miss.append(counter('dns_cache_misses'))
+        return trace
+
+
+class CachedResponse:
+    """
+    A read response, that can be stored on the ResponseCache.
+    """
+    __slots__ = ('url', 'status', 'encoding', 'body', 'expires', 'stale_until')
+
+    def __init__(self, url, status, encoding, body, expires=0.0, stale_until=0.0):
+        self.url = url
+        self.status = status
+        self.encoding = encoding
+        self.body = body
+        self.expires = expires
+        self.stale_until = stale_until
+
+    def text(self):
+        return self.body.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text())
+
+
+class ResponseCache:
+    """
+    Keeps the responses of external APIs for a given time, in memory (on a LRU cache limited by the responses
+    size) and optionally on disk. Expired responses can still be used for a while, in which case they're
+    returned right away and refreshed in the background (stale-while-revalidate).
+    """
+    # Only responses with these status codes are kept
+    cache_status = [200, 404]
+
+    def __init__(self, client):
+        """
+        :param client: The WebClient instance. Its SingleFlight instance is used to merge concurrent requests for
+        the same response.
+        """
+        self.client = client
+        self.flights = client.flights
+        self.memory = LRUCache(settings.http_cache_size * 1024, sizeof=lambda r: len(r.body) + len(r.url))
+        self.path = Path(settings.http_cache_dir) if settings.http_cache_dir else None
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0}
+        self._refreshing = {}
+
+    async def fetch(self, session, url, ttl, stale_ttl=None, method='GET', **kwargs):
+        """
+        Retrieves a response from the cache, or requests and stores it if it's not cached or it's too old.
+        :param session: The session used for the request.
+        :param url: The request URL.
+        :param ttl: The time in seconds to keep the response.
+        :param stale_ttl: The time in seconds an expired response can be used while it's refreshed. By default,
+        it's the same as the ttl.
+        :param method: The request method.
+        :param kwargs: The request options.
+        :return: A CachedResponse instance.
+        """
+        stale_ttl = ttl if stale_ttl is None else stale_ttl
+        key = self.make_key(session, method, url, kwargs)
+        response = await self.get(key)
+        now = time.time()
+
+        if response is not None and now < response.expires:
+            self.stats['hits'] += 1
+            return response
+
+        if response is not None and now < response.stale_until:
+            self.stats['stale_hits'] += 1
+            if key not in self._refreshing:
+                coro = self.refresh(key, session, method, url, kwargs, ttl, stale_ttl)
+                self._refreshing[key] = asyncio.get_running_loop().create_task(coro)
+            return response
+
+        self.stats['misses'] += 1
+        return await self.flights.run(key, self.load, key, session, method, url, kwargs, ttl, stale_ttl)
+
+    async def load(self, key, session, method, url, kwargs, ttl, stale_ttl):
+        response = await self.request(session, method, url, kwargs)
+        await self.store(key, response, ttl, stale_ttl)
+        return response
+
+    async def refresh(self, key, session, method, url, kwargs, ttl, stale_ttl):
+        try:
+            await self.flights.run(key, self.load, key, session, method, url, kwargs, ttl, stale_ttl)
+            self.stats['refreshes'] += 1
+        except Exception as e:
+            self.stats['refresh_errors'] += 1
+            log.warning('Could not refresh the cached response for %s: %s', url, e)
+        finally:
+            del self._refreshing[key]
+
+    @staticmethod
+    async def request(session, method, url, kwargs):
+        async with session.request(method, url, **kwargs) as r:
+            body = await r.read()
+            return CachedResponse(str(r.url), r.status, r.get_encoding(), body)
+
+    async def get(self, key):
+        response = self.memory.get(key)
+        if response is None and self.path is not None:
+            response = await asyncio.to_thread(self._disk_read, key)
+            if response is not None:
+                self.memory.set(key, response)
+
+        return response
+
+    async def store(self, key, response, ttl, stale_ttl):
+        if response.status not in self.cache_status:
+            return
+
+        response.expires = time.time() + ttl
+        response.stale_until = response.expires + stale_ttl
+        self.memory.set(key, response)
+
+        if self.path is not None:
+            await asyncio.to_thread(self._disk_write, key, response)
+
+    def make_key(self, session, method, url, kwargs):
+        """
+        Builds the key of a request, from its method, its normalized URL (with sorted query parameters), its
+        parameters and body, and what identifies its sender: the session name, the session and request headers
+        (e.g. the User-Agent or the authorization), and the cookies sent to the URL. Responses are only shared
+        between requests that would've been sent the same way.
+        """
+        url = URL(url)
+        url = url.with_query(sorted(url.query.items()))
+        parts = [method.upper(), str(url)]
+        for option in ['params', 'data', 'json']:
+            if kwargs.get(option) is not None:
+                parts.append(json.dumps(kwargs[option], sort_keys=True, default=str))
+
+        headers = {name.lower(): value for name, value in session.headers.items()}
+        headers.update({name.lower(): value for name, value in (kwargs.get('headers') or {}).items()})
+        cookies = sorted((name, cookie.value) for name, cookie in session.cookie_jar.filter_cookies(url).items())
+        identity = json.dumps([self.client.session_name(session), sorted(headers.items()), cookies], default=str)
+        # Keys are stored along with the responses on disk, so the headers and cookies values are not kept on them
+        parts.append(hashlib.sha256(identity.encode('utf-8')).hexdigest())
+
+        return '\n'.join(parts)
+
+    def metrics(self):
+        return {**self.stats, 'entries': len(self.memory), 'size': self.memory.size,
+                'evictions': self.memory.evictions, 'collapsed': self.flights.collapsed}
+
+    async def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+
+        if self.path is not None:
+            await asyncio.to_thread(self.prune)
+
+    def prune(self):
+        """
+        Removes the responses stored on disk that can't be used anymore.
+        """
+        now = time.time()
+        for file in self.path.glob('*.response'):
+            try:
+                with file.open('rb') as f:
+                    stale_until = marshal.load(f)[6]
+                if stale_until < now:
+                    file.unlink()
+            except (OSError, EOFError, ValueError, TypeError, IndexError):
+                file.unlink(missing_ok=True)
+
+    def _disk_file(self, key):
+        return self.path / (hashlib.sha1(key.encode('utf-8')).hexdigest() + '.response')
+
+    def _disk_read(self, key):
+        file = self._disk_file(key)
+        try:
+            with file.open('rb') as f:
+                stored_key, url, status, encoding, body, expires, stale_until = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            log.warning('Could not read the cached response %s: %s', file, e)
+            return None
+
+        if stored_key != key or stale_until < time.time():
+            return None
+
+        return CachedResponse(url, status, encoding, body, expires, stale_until)
+
+    def _disk_write(self, key, response):
+        file = self._disk_file(key)
+        data = (key, response.url, response.status, response.encoding, response.body, response.expires,
+                response.stale_until)
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_file = file.with_suffix('.tmp')
+            with tmp_file.open('wb') as f:
+                marshal.dump(data, f)
+            tmp_file.replace(file)
+        except OSError as e:
+            log.warning('Could not store the cached response %s: %s', file, e)
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bot import settings
+from bot.logger import new_logger
+
+log = new_logger('Workers')
+
+
+class WorkersBusyError(Exception):
+    """
+    Raised when a job could not be queued on the worker pool because it's full.
+    """
+    pass
+
+
+class WorkerPool:
+    """
+    Process pool shared by the whole bot, to run CPU-bound work (e.g. image processing) outside the event
+    loop's process. Jobs must be picklable module-level functions, with picklable arguments and results.
+    The amount of queued jobs is limited: callers wait for a free slot for a while, and if there's none,
+    the job is rejected with a WorkersBusyError.
+    """
+    _ins = None
+
+    def __new__(cls):
+        if cls._ins is None:
+            cls._ins = super().__new__(cls)
+        return cls._ins
+
+    def __init__(self):
+        # The instance is shared, so it's initialized only once
+        if hasattr(self, 'stats'):
+            return
+
+        self.processes = settings.worker_processes or max(multiprocessing.cpu_count() - 1, 1)
+        self.max_queued = settings.worker_queue_size or self.processes * 4
+        self.stats = {'jobs': 0, 'errors': 0, 'rejected': 0, 'total_time': 0.0, 'max_time': 0.0,
+                      'total_wait': 0.0}
+        self.queued = 0
+        self._executor = None
+        self._slots = None
+
+    @property
+    def executor(self):
+        """
+        The process pool, created on its first use. Worker processes are started with the "spawn" method by
+        default, as forking a process with running threads is not safe.
+        """
+        if self._executor is None:
+            context = multiprocessing.get_context(settings.worker_start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a function on the worker pool.
+        :param func: The module-level function to call.
+        :return: The function's result.
+        :raises WorkersBusyError: If the pool is still full after waiting settings.worker_queue_timeout seconds.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queued)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.worker_queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            log.warning('Worker pool is full, rejected a %s call', func.__qualname__)
+            raise WorkersBusyError()
+
+        self.queued += 1
+        queued_time = time.perf_counter()
+        self.stats['total_wait'] += queued_time - start
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - queued_time
+            self.queued -= 1
+            self.stats['jobs'] += 1
+            self.stats['total_time'] += elapsed
+            self.stats['max_time'] = max(self.stats['max_time'], elapsed)
+            self._slots.release()
+
+    def metrics(self):
+        return {'processes': self.processes, 'max_queued': self.max_queued, 'queued': self.queued, **self.stats}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,7 +1,7 @@
 import itertools
 import peewee
-from bot.database import BotDatabase
 from bot import bot
+from bot.migrations import migrate
 
 
 def run():
@@ -15,9 +15,9 @@ def run():
     ]
 
     print('Models loaded ({}):'.format(len(models)), models)
-    print('Creating tables...')
-    BotDatabase().create_tables(models)
-    print('Tables created!')
+    print('Creating and migrating tables...')
+    migrate(models)
+    print('Tables ready!')
 
 
 if __name__ == '__main__':
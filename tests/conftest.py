@@ -0,0 +1,4 @@
+import os
+
+# The bot's modules connect to the database when they're imported
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
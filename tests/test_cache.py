@@ -0,0 +1,45 @@
+import os
+
+from bot.cache import DiskCache
+
+
+def test_disk_cache_overwrite_keeps_size(tmp_path):
+    cache = DiskCache(tmp_path, 100)
+    cache.set('a', b'x' * 60)
+    cache.set('a', b'y' * 50)
+    assert cache.size == 50
+    assert cache.get('a') == b'y' * 50
+
+    # The replaced value does not count towards the limit, so nothing is removed
+    cache.set('b', b'z' * 40)
+    assert cache.size == 90
+    assert cache.get('a') is not None
+
+
+def test_disk_cache_pop_frees_size(tmp_path):
+    cache = DiskCache(tmp_path, 100)
+    cache.set('a', b'x' * 60)
+    cache.pop('a')
+    cache.pop('a')
+    assert cache.size == 0
+    assert cache.get('a') is None
+
+
+def test_disk_cache_prunes_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, 100)
+    cache.set('a', b'x' * 40)
+    cache.set('b', b'x' * 40)
+    # The files could be written within the same timestamp, so their use times are set explicitly
+    os.utime(cache.file('a'), (1000, 1000))
+    os.utime(cache.file('b'), (500, 500))
+    cache.set('c', b'x' * 40)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.size == 80
+
+
+def test_disk_cache_size_loaded_from_disk(tmp_path):
+    DiskCache(tmp_path, 100).set('a', b'x' * 30)
+    cache = DiskCache(tmp_path, 100)
+    cache.set('b', b'x' * 20)
+    assert cache.size == 50
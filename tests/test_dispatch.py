@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from bot import AlexisBot, Command
+
+
+class Recorder(Command):
+    def __init__(self, bot, name, priority, delay=0.0, timeout=None):
+        super().__init__(bot)
+        self.name = name
+        self.priority = priority
+        self.delay = delay
+        if timeout is not None:
+            self.handler_timeout = timeout
+
+    async def on_test_event(self, calls):
+        calls.append(('start', self.name))
+        await asyncio.sleep(self.delay)
+        calls.append(('end', self.name))
+
+
+@pytest.fixture
+def bot():
+    bot = AlexisBot()
+    state = bot.cmd_instances, bot.initialized
+    bot.initialized = True
+    yield bot
+    bot.cmd_instances, bot.initialized = state
+    bot.register_handlers()
+
+
+def dispatch(bot, modules):
+    bot.cmd_instances = sorted(modules, key=lambda i: i.priority)
+    bot.register_handlers()
+    calls = []
+    asyncio.run(bot.dispatch_event('on_test_event', calls=calls))
+    return calls
+
+
+def test_priorities_run_in_order(bot):
+    calls = dispatch(bot, [Recorder(bot, 'late', 20), Recorder(bot, 'early', 10, delay=0.05)])
+    assert calls == [('start', 'early'), ('end', 'early'), ('start', 'late'), ('end', 'late')]
+
+
+def test_same_priority_runs_concurrently(bot):
+    start = time.perf_counter()
+    calls = dispatch(bot, [Recorder(bot, 'a', 10, delay=0.1), Recorder(bot, 'b', 10, delay=0.1)])
+    assert time.perf_counter() - start < 0.18
+    assert calls[:2] == [('start', 'a'), ('start', 'b')]
+
+
+def test_slow_handler_times_out(bot):
+    calls = dispatch(bot, [Recorder(bot, 'slow', 10, delay=1, timeout=0.05), Recorder(bot, 'next', 20)])
+    assert calls == [('start', 'slow'), ('start', 'next'), ('end', 'next')]
+    assert bot.handler_stats['Recorder.on_test_event']['timeouts'] >= 1
+
+
+def test_timeout_disabled(bot):
+    calls = dispatch(bot, [Recorder(bot, 'slow', 10, delay=0.1, timeout=0)])
+    assert calls == [('start', 'slow'), ('end', 'slow')]
@@ -0,0 +1,55 @@
+import peewee
+import pytest
+
+from bot.database import BotDatabase
+from bot.guild_configuration import ServerConfig
+from bot.migrations import SchemaVersion, alter_indexed_columns, migrate
+
+
+@pytest.fixture
+def old_server_config():
+    """
+    A ServerConfig table as it was before its indexes were declared.
+    """
+    db = BotDatabase().db
+    db.drop_tables([ServerConfig, SchemaVersion], safe=True)
+    ServerConfig.create_table()
+    ServerConfig._schema.drop_indexes()
+    SchemaVersion.create_table()
+    SchemaVersion.create(table=ServerConfig._meta.table_name, version=0)
+    yield
+    db.drop_tables([ServerConfig, SchemaVersion], safe=True)
+
+
+def test_duplicates_removed_before_unique_index(old_server_config):
+    ServerConfig.create(serverid='1', name='prefix', value='old')
+    ServerConfig.create(serverid='1', name='prefix', value='new')
+    ServerConfig.create(serverid='1', name='lang', value='en')
+    ServerConfig.create(serverid='2', name='prefix', value='other')
+
+    migrate([ServerConfig])
+
+    rows = ServerConfig.select(ServerConfig.serverid, ServerConfig.name, ServerConfig.value).tuples()
+    assert sorted(rows) == [('1', 'lang', 'en'), ('1', 'prefix', 'new'), ('2', 'prefix', 'other')]
+    assert SchemaVersion.get(table=ServerConfig._meta.table_name).version == len(ServerConfig.schema_migrations)
+    with pytest.raises(peewee.IntegrityError):
+        ServerConfig.create(serverid='1', name='prefix', value='again')
+
+
+def test_mysql_indexed_columns_altered():
+    class FakeMySQL(peewee.MySQLDatabase):
+        def __init__(self):
+            super().__init__('test')
+            self.queries = []
+
+        def execute_sql(self, sql, params=None, commit=None):
+            self.queries.append(sql)
+
+    db = FakeMySQL()
+    with db.bind_ctx([ServerConfig]):
+        alter_indexed_columns(ServerConfig)
+
+    assert sorted(db.queries) == [
+        'ALTER TABLE `serverconfig` MODIFY `name` VARCHAR(100) NOT NULL',
+        'ALTER TABLE `serverconfig` MODIFY `serverid` VARCHAR(32) NOT NULL',
+    ]
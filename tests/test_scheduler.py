@@ -0,0 +1,50 @@
+import asyncio
+
+from bot.scheduler import FIXED_DELAY, TaskScheduler
+
+
+def test_stop_cancels_running_fixed_delay_task():
+    async def test():
+        scheduler = TaskScheduler()
+        started = asyncio.Event()
+        runs = []
+
+        async def work():
+            runs.append('start')
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                runs.append('cancelled')
+                raise
+
+        task = scheduler.add('work', work, interval=0.01, mode=FIXED_DELAY)
+        await started.wait()
+        await scheduler.stop()
+
+        assert runs == ['start', 'cancelled']
+        assert not task.is_running()
+
+        # The cancelled task is not scheduled again
+        await asyncio.sleep(0.05)
+        assert runs == ['start', 'cancelled']
+
+    asyncio.run(test())
+
+
+def test_stop_from_a_task():
+    async def test():
+        scheduler = TaskScheduler()
+        done = asyncio.Event()
+
+        async def work():
+            await scheduler.stop()
+            done.set()
+
+        scheduler.add('stopper', work, interval=0.01, mode=FIXED_DELAY)
+        await asyncio.wait_for(done.wait(), 1)
+
+        await asyncio.sleep(0.05)
+        assert scheduler._tasks == set() and scheduler._heap == []
+
+    asyncio.run(test())
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.web import ResponseCache, WebClient
+
+
+class Server:
+    """
+    A local server that counts its requests, and answers with the request count.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.status = 200
+        self.server = None
+
+    async def handle(self, request):
+        self.hits += 1
+        return web.Response(text=str(self.hits), status=self.status)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route('*', '/{path:.*}', self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.server.close()
+
+    def url(self, path='/'):
+        return str(self.server.make_url(path))
+
+
+def run(test):
+    async def wrapper():
+        client = WebClient()
+        client.cache = ResponseCache(client)
+        try:
+            async with Server() as server:
+                await test(client, server)
+        finally:
+            await client.close()
+
+    asyncio.run(wrapper())
+
+
+def test_get_is_cached():
+    async def test(client, server):
+        session = client.session('Test')
+        first = await client.fetch(session, server.url(), ttl=60)
+        second = await client.fetch(session, server.url(), ttl=60)
+        assert (first.text(), second.text(), server.hits) == ('1', '1', 1)
+
+    run(test)
+
+
+def test_query_order_shares_response():
+    async def test(client, server):
+        session = client.session('Test')
+        await client.fetch(session, server.url('/?a=1&b=2'), ttl=60)
+        r = await client.fetch(session, server.url('/?b=2&a=1'), ttl=60)
+        assert (r.text(), server.hits) == ('1', 1)
+
+    run(test)
+
+
+def test_sessions_do_not_share_responses():
+    async def test(client, server):
+        await client.fetch(client.session('First'), server.url(), ttl=60)
+        r = await client.fetch(client.session('Second'), server.url(), ttl=60)
+        assert (r.text(), server.hits) == ('2', 2)
+
+    run(test)
+
+
+def test_request_headers_are_part_of_the_key():
+    async def test(client, server):
+        session = client.session('Test')
+        await client.fetch(session, server.url(), ttl=60, headers={'Authorization': 'a'})
+        r = await client.fetch(session, server.url(), ttl=60, headers={'Authorization': 'b'})
+        assert (r.text(), server.hits) == ('2', 2)
+
+    run(test)
+
+
+def test_cookies_are_part_of_the_key():
+    async def test(client, server):
+        session = client.session('Test')
+        await client.fetch(session, server.url(), ttl=60)
+        session.cookie_jar.update_cookies({'user': 'someone'}, server.server.make_url('/'))
+        r = await client.fetch(session, server.url(), ttl=60)
+        assert (r.text(), server.hits) == ('2', 2)
+
+    run(test)
+
+
+def test_post_is_only_cached_when_allowed():
+    async def test(client, server):
+        session = client.session('Test')
+        await client.fetch(session, server.url(), ttl=60, method='POST', data='q')
+        r = await client.fetch(session, server.url(), ttl=60, method='POST', data='q')
+        assert (r.text(), server.hits) == ('2', 2)
+
+        await client.fetch(session, server.url(), ttl=60, method='POST', data='q', cache_post=True)
+        r = await client.fetch(session, server.url(), ttl=60, method='POST', data='q', cache_post=True)
+        assert (r.text(), server.hits) == ('3', 3)
+
+    run(test)
+
+
+def test_errors_are_not_cached():
+    async def test(client, server):
+        session = client.session('Test')
+        server.status = 500
+        await client.fetch(session, server.url(), ttl=60)
+        server.status = 200
+        r = await client.fetch(session, server.url(), ttl=60)
+        assert (r.status, r.text(), server.hits) == (200, '2', 2)
+
+    run(test)
+
+
+def test_stale_response_is_refreshed_in_background():
+    async def test(client, server):
+        session = client.session('Test')
+        r = await client.fetch(session, server.url(), ttl=60, stale_ttl=60)
+        r.expires = 0
+
+        stale = await client.fetch(session, server.url(), ttl=60, stale_ttl=60)
+        assert stale.text() == '1'
+        await asyncio.gather(*client.cache._refreshing.values())
+
+        fresh = await client.fetch(session, server.url(), ttl=60, stale_ttl=60)
+        assert (fresh.text(), server.hits) == ('2', 2)
+        assert client.cache.stats['stale_hits'] == 1
+
+    run(test)
+
+
+@pytest.mark.parametrize('method', ['PUT', 'DELETE'])
+def test_other_methods_are_not_cached(method):
+    async def test(client, server):
+        session = client.session('Test')
+        await client.fetch(session, server.url(), ttl=60, method=method, cache_post=True)
+        await client.fetch(session, server.url(), ttl=60, method=method, cache_post=True)
+        assert server.hits == 2
+
+    run(test)